@@ -0,0 +1,331 @@
+'''
+Measure the interactive performance of MatplotlibWidget headless.
+
+Every benchmark is run for a range of data sizes and numbers of artists,
+the timings are written as JSON, e.g.::
+
+    python benchmarks/bench_interactive.py --output before.json
+    python benchmarks/bench_interactive.py --sizes 1e3 1e5 --artists 1 10
+
+Latencies include the time until the frame is rendered, i.e. pending
+redraw requests are flushed before the clock is stopped. Results are not
+written to the persistent result store.
+'''
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from timeit import default_timer as clock
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ['MPLWIDGET_RESULTS'] = ':memory:'
+
+import matplotlib
+import numpy as np
+from matplotlib.backend_bases import MouseEvent
+from matplotlib.backends.qt_compat import QtCore, QtGui
+
+try:
+    from matplotlib.backends.qt_compat import QtWidgets
+except ImportError:
+    QtWidgets = QtGui
+
+from mplwidget import MatplotlibWidget
+from mplwidget.artist_data import get_data, invalidate
+from mplwidget.axis_span import AxisSpan
+from mplwidget.fit_widget import FitWidget
+from mplwidget.model_widget import ModelContainer
+from mplwidget.redraw import flush_redraw
+
+import lmfit
+
+
+BENCHMARKS = ['draw', 'scroll_zoom', 'pan', 'back_forward', 'axis_span',
+              'right_click', 'get_data', 'get_data_bar', 'fit', 'fit_cached']
+
+# kind of the plotted artists by benchmark, lines if not given; hit testing
+# and extraction are slowest for the many patches of bar charts
+KINDS = {'right_click': 'bar',
+         'get_data': 'errorbar',
+         'get_data_bar': 'bar'}
+
+# a patch per point, larger bar charts take too long to create
+MAX_BARS = 1e5
+
+
+def make_widget(size, artists, kind='line'):
+    widget = MatplotlibWidget(hold=True, width=8, height=6)
+    widget.resize(800, 600)
+    axes = widget.axes
+    x = np.linspace(0., 100., size)
+    rng = np.random.RandomState(0)
+
+    for i in range(artists):
+        y = np.exp(-(x - 50.) ** 2 / 50.) + 0.05 * rng.randn(size) + i
+
+        if kind == 'line':
+            axes.plot(x, y, label='data {0}'.format(i))
+        elif kind == 'errorbar':
+            axes.errorbar(x, y, yerr=0.05, label='data {0}'.format(i))
+        elif kind == 'bar':
+            axes.bar(x, y, width=x[1] - x[0], label='data {0}'.format(i))
+
+    widget.draw()
+
+    return widget
+
+
+def mouse_event(widget, name, xy, button=None, step=0):
+    '''Create a mouse event at data coordinates *xy* of the widget axes'''
+    x, y = widget.axes.transData.transform(xy)
+
+    return MouseEvent(name, widget, x, y, button=button, step=step)
+
+
+def timed(func, repeat):
+    times = []
+
+    for i in range(repeat):
+        start = clock()
+        func(i)
+        times.append(clock() - start)
+
+    return times
+
+
+def bench_draw(widget, repeat):
+    return timed(lambda i: widget.draw(), repeat)
+
+
+def bench_scroll_zoom(widget, repeat):
+    toolbar = widget.toolbar
+
+    def scroll(i):
+        step = 1 if i % 2 == 0 else -1
+        toolbar.scroll_zoom(widget.axes, step, location=(50., 0.5))
+        flush_redraw(widget)
+
+    times = timed(scroll, repeat)
+    toolbar._scrollTimer.stop()
+    toolbar._release_scroll()
+
+    return times
+
+
+def bench_pan(widget, repeat):
+    toolbar = widget.toolbar
+    toolbar._middle_click(mouse_event(widget, 'button_press_event',
+                                      (50., 0.5), button=2))
+
+    def drag(i):
+        event = mouse_event(widget, 'motion_notify_event',
+                            (50. + (i % 10), 0.5), button=2)
+        toolbar.drag_pan(event)
+        flush_redraw(widget)
+
+    times = timed(drag, repeat)
+    toolbar.release_pan(mouse_event(widget, 'button_release_event',
+                                    (50., 0.5), button=2))
+
+    return times
+
+
+def bench_back_forward(widget, repeat):
+    toolbar = widget.toolbar
+
+    for i in range(3):
+        widget.axes.set_xlim(10. * i, 100. - 10. * i)
+        toolbar.push_current()
+
+    def navigate(i):
+        if i % 2 == 0:
+            toolbar.back()
+        else:
+            toolbar.forward()
+
+        flush_redraw(widget)
+
+    return timed(navigate, repeat)
+
+
+def bench_axis_span(widget, repeat, useblit=True):
+    press = mouse_event(widget, 'button_press_event', (20., 0.5), button=1)
+    span = AxisSpan(widget.axes, press, lambda vmin, vmax: None,
+                    'horizontal', useblit=useblit)
+    widget.draw()
+
+    def move(i):
+        event = mouse_event(widget, 'motion_notify_event',
+                            (30. + i % 50, 0.5), button=1)
+        span.onmove(event)
+        flush_redraw(widget)
+
+    times = timed(move, repeat)
+
+    for cid in span.cids:
+        widget.mpl_disconnect(cid)
+
+    return times
+
+
+def bench_right_click(widget, repeat):
+    toolbar = widget.toolbar
+    event = mouse_event(widget, 'button_press_event', (50., 1.), button=3)
+
+    # only the hit testing is measured, the menu is not shown
+    exec_ = QtWidgets.QMenu.exec_
+    QtWidgets.QMenu.exec_ = lambda self, *args: None
+
+    try:
+        return timed(lambda i: toolbar._right_click(event), repeat)
+    finally:
+        QtWidgets.QMenu.exec_ = exec_
+
+
+def bench_get_data(widget, repeat):
+    artists = list(widget.axes.containers) or list(widget.axes.get_lines())
+
+    def extract(i):
+        # every other call is answered from the cache
+        if i % 2 == 0:
+            invalidate()
+
+        for artist in artists:
+            get_data(artist)
+
+    return timed(extract, repeat)
+
+
+def bench_fit(widget, repeat, cached=False):
+    app = QtWidgets.QApplication.instance()
+    artist = widget.axes.get_lines()[0]
+
+    model = ModelContainer('bench')
+    model.add_component(lmfit.models.GaussianModel())
+    model.add_component(lmfit.models.LinearModel())
+    params = model.get_parameters()
+    params['amplitude'].value = 10.
+    params['center'].value = 45.
+    params['sigma'].value = 3.
+    params['slope'].value = 0.
+    params['intercept'].value = 0.
+
+    fit_widget = FitWidget(widget.toolbar, artist)
+    fit_widget.model_dict[model.name] = model
+    pool = QtCore.QThreadPool.globalInstance()
+
+    def fit(i):
+        # the first fit fills the cache, the following ones are answered
+        # from it unless it is cleared
+        if not cached:
+            fit_widget.fit_cache.clear()
+
+        x, y, w = get_data(artist)
+        fit_widget._perform_fit(model, x, y, w)
+        pool.waitForDone()
+        # deliver the finished signal, which stores and plots the result
+        app.processEvents()
+        flush_redraw(widget)
+
+    times = timed(fit, repeat)
+    fit_widget.close()
+
+    return times
+
+
+def bench_fit_cached(widget, repeat):
+    return bench_fit(widget, repeat, cached=True)
+
+
+def summarise(times):
+    times = np.asarray(times) * 1e3
+
+    return {'times_ms': times.tolist(),
+            'median_ms': float(np.median(times)),
+            'p90_ms': float(np.percentile(times, 90)),
+            'min_ms': float(times.min()),
+            'mean_ms': float(times.mean())}
+
+
+def run(benchmarks, sizes, artists, repeat, max_points):
+    results = []
+
+    for name in benchmarks:
+        func = globals()['bench_' + name.replace('_bar', '')]
+        kind = KINDS.get(name, 'line')
+        # fits take long, a few of them are enough
+        n = min(repeat, 3) if name == 'fit' else repeat
+
+        for size in sizes:
+            for count in artists:
+                if size * count > max_points:
+                    continue
+
+                if kind == 'bar' and size * count > MAX_BARS:
+                    continue
+
+                widget = make_widget(size, count, kind=kind)
+
+                try:
+                    times = func(widget, n)
+                finally:
+                    widget.close()
+
+                entry = {'benchmark': name, 'size': size, 'artists': count,
+                         'repeat': n}
+                entry.update(summarise(times))
+                results.append(entry)
+
+                print('{0:<14s} {1:>9d} {2:>4d} {3:10.2f} ms'.format(
+                    name, size, count, entry['median_ms']),
+                    file=sys.stderr)
+
+    return results
+
+
+def metadata():
+    return {'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'matplotlib': matplotlib.__version__,
+            'lmfit': lmfit.__version__,
+            'qt': QtCore.qVersion()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS,
+                        default=BENCHMARKS)
+    parser.add_argument('--sizes', nargs='+', type=float,
+                        default=[1e3, 1e4, 1e5, 1e6, 1e7])
+    parser.add_argument('--artists', nargs='+', type=int, default=[1, 10])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--max-points', type=float, default=1e7,
+                        help='skip runs with more points in total')
+    parser.add_argument('--output', help='JSON file, default is stdout')
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    results = run(args.benchmarks, [int(s) for s in args.sizes],
+                  args.artists, args.repeat, args.max_points)
+    report = {'metadata': metadata(), 'results': results}
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2)
+
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+'''
+Compare coarse-to-fine fitting with a direct fit of the full data.
+
+Run with::
+
+    python benchmarks/bench_multires.py
+    python benchmarks/bench_multires.py --sizes 1e5 1e6 1e7
+'''
+
+from __future__ import print_function
+
+import argparse
+import copy
+import time
+
+import numpy as np
+import lmfit
+
+from mplwidget.model_widget import ModelContainer
+from mplwidget.multires import multires_fit
+
+
+class CountingModel(object):
+    '''Count the points the wrapped fit function evaluates the model on'''
+    def __init__(self, model):
+        self.model = model
+        self.points = 0
+
+    def fit(self, y, **kwargs):
+        def count(params, iteration, resid, *args, **kws):
+            self.points += len(y)
+
+        kwargs['iter_cb'] = count
+
+        return self.model.fit(y, **kwargs)
+
+
+def make_model():
+    model = ModelContainer('bench')
+    model.add_component(lmfit.models.GaussianModel())
+    model.add_component(lmfit.models.GaussianModel())
+    model.add_component(lmfit.models.LinearModel())
+
+    # the model prefixes the clashing gaussians itself
+    g1, g2, linear = model.get_components()
+    start = [(g1, {'amplitude': 20., 'center': 38., 'sigma': 5.}),
+             (g2, {'amplitude': 10., 'center': 62., 'sigma': 3.}),
+             (linear, {'slope': 0., 'intercept': 0.})]
+    params = model.get_parameters()
+
+    for comp, values in start:
+        for name, value in values.items():
+            params[comp.prefix + name].value = value
+
+    return model
+
+
+def make_data(n, seed=0):
+    x = np.linspace(0., 100., n)
+    rng = np.random.RandomState(seed)
+    y = (30. * np.exp(-(x - 40.) ** 2 / 32.) +
+         15. * np.exp(-(x - 60.) ** 2 / 8.) + 0.05 * x + rng.randn(n))
+
+    return x, y, np.ones(n)
+
+
+def run(fit, model, x, y, w):
+    params = copy.deepcopy(model.get_parameters())
+    start = time.time()
+    result = fit(y, x=x, weights=w, params=params)
+
+    return result, time.time() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', nargs='+', type=float,
+                        default=[1e5, 1e6, 3e6])
+    args = parser.parse_args(argv)
+
+    model = make_model()
+
+    print('{0:>9s} {1:<14s} {2:>10s} {3:>13s} {4:>12s}'.format(
+        'size', 'mode', 'time [ms]', 'points eval.', 'max |d|/err'))
+
+    for size in args.sizes:
+        x, y, w = make_data(int(size))
+        counting = CountingModel(model)
+        direct, t_direct = run(counting.fit, model, x, y, w)
+        points_direct = counting.points
+
+        counting.points = 0
+        multires, t_multires = run(
+            lambda *a, **kw: multires_fit(counting.fit, *a, **kw),
+            model, x, y, w)
+
+        deviation = max(
+            abs(par.value - multires.params[name].value) / par.stderr
+            for name, par in direct.params.items()
+            if par.vary and par.stderr)
+
+        print('{0:9d} {1:<14s} {2:10.1f} {3:13d} {4:>12s}'.format(
+            int(size), 'direct', t_direct * 1e3, points_direct, ''))
+        print('{0:9d} {1:<14s} {2:10.1f} {3:13d} {4:12.2e}'.format(
+            int(size), 'coarse to fine', t_multires * 1e3, counting.points,
+            deviation))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+'''
+Compare the log space PoissonModel with the former implementation.
+
+Run with::
+
+    python benchmarks/bench_poisson.py
+'''
+
+from __future__ import print_function
+
+import time
+
+import numpy as np
+from scipy.special import factorial
+from lmfit.model import Model
+
+from mplwidget.models.poisson import PoissonModel
+
+
+class LegacyPoissonModel(Model):
+    def __init__(self, *args, **kwargs):
+        def poisson(x, amp, mu):
+            return amp * np.exp(-mu) * mu ** x / factorial(x)
+
+        super(LegacyPoissonModel, self).__init__(poisson, *args, **kwargs)
+
+
+def make_data(mu=60., amp=1e5, n=170, repeat=200, seed=0):
+    # x! overflows for x > 170 in the legacy implementation
+    x = np.tile(np.arange(n, dtype=float), repeat)
+    rng = np.random.RandomState(seed)
+    y = rng.poisson(amp * np.exp(-mu) * mu ** x / factorial(x))
+    weights = 1. / np.sqrt(np.maximum(y, 1))
+
+    return x, y.astype(float), weights
+
+
+def run(model, x, y, weights, **kwargs):
+    params = model.make_params(amp=5e4, mu=50.)
+    start = time.time()
+    result = model.fit(y, params=params, x=x, weights=weights, **kwargs)
+    elapsed = time.time() - start
+
+    return result, elapsed
+
+
+def main():
+    x, y, weights = make_data()
+
+    cases = [('legacy', LegacyPoissonModel(), {}),
+             ('log space', PoissonModel(), {}),
+             ('log space + jacobian', PoissonModel(), {'jacobian': True})]
+
+    print('{0:<22s} {1:>6s} {2:>10s} {3:>10s} {4:>10s}'.format(
+        'implementation', 'nfev', 'time [ms]', 'amp', 'mu'))
+
+    for name, model, kwargs in cases:
+        result, elapsed = run(model, x, y, weights, **kwargs)
+        print('{0:<22s} {1:6d} {2:10.2f} {3:10.1f} {4:10.4f}'.format(
+            name, result.nfev, elapsed * 1e3,
+            result.params['amp'].value, result.params['mu'].value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+'''
+Extraction of the data shown by an artist, e.g. for fitting.
+
+Extracted data is cached per artist. An entry is reused as long as the
+change token of the artist is unchanged, which consists of the objects
+holding its data: matplotlib replaces these when the data is set, so
+comparing them by identity is enough to detect changes. Entries are
+dropped together with their artist.
+
+The bars of a bar chart are changed in place, e.g. with set_height. Every
+change marks a bar as stale, which is counted by _BarVersion, so the count
+is the change token of a bar chart.
+'''
+
+from functools import partial
+from itertools import chain
+from operator import attrgetter
+import weakref
+
+import numpy as np
+import matplotlib as mpl
+from matplotlib.cbook import flatten
+from matplotlib.collections import PolyCollection, PathCollection
+
+try:
+    from matplotlib.patches import StepPatch
+except ImportError:
+    # added in matplotlib 3.4
+    StepPatch = None
+
+
+# cached data by artist, containers are stored under their first child
+# since tuples cannot be weakly referenced
+_cache = weakref.WeakKeyDictionary()
+
+
+def _histogram_weights(y):
+    # using sqrt(y) assuming this is a histogram
+    with np.errstate(divide='ignore'):
+        weights = 1. / np.sqrt(y)
+
+    weights[np.isinf(weights)] = 0
+
+    return weights
+
+
+def _line_token(line):
+    return (line._xorig, line._yorig)
+
+
+def _line_data(artist):
+    if hasattr(artist, 'lod'):
+        # the line only shows decimated data
+        x, y = artist.lod.get_data()
+    else:
+        x, y = artist.get_data()
+
+    # copies, the arrays of the line must stay writeable
+    x = np.array(x, dtype=float)
+    y = np.array(y, dtype=float)
+
+    return x, y, np.ones(len(x))
+
+
+def _bar_data(artist):
+    # there is no array of the geometry, the attributes of all patches are
+    # read in a single pass
+    patches = artist.patches
+    values = chain.from_iterable(map(attrgetter('_x0', '_width', '_height'),
+                                     patches))
+    geometry = np.fromiter(values, dtype=float, count=3 * len(patches))
+    geometry = geometry.reshape(-1, 3)
+
+    x = geometry[:, 0] + geometry[:, 1] / 2.
+    y = geometry[:, 2]
+
+    return x, y, _histogram_weights(y)
+
+
+class _BarVersion(object):
+    '''
+    Count the changes of the bars in *patches*.
+
+    The stale callbacks of the patches are wrapped, they are called
+    whenever the geometry or any other property of a patch is set.
+    '''
+    def __init__(self, patches):
+        self.count = 0
+
+        # the patches of an axes share their callback, so do the wrappers
+        wrappers = {}
+
+        for patch in patches:
+            callback = patch.stale_callback
+
+            try:
+                wrapper = wrappers[callback]
+            except KeyError:
+                wrapper = wrappers[callback] = partial(self._changed, callback)
+
+            patch.stale_callback = wrapper
+
+    def _changed(self, callback, artist, value):
+        self.count += 1
+
+        if callback is not None:
+            callback(artist, value)
+
+
+def _bar_token(artist):
+    # stored on the container, the version must not refer to the patches
+    version = getattr(artist, '_dataVersion', None)
+
+    if version is None:
+        version = _BarVersion(artist.patches)
+        artist._dataVersion = version
+
+    return (version, version.count)
+
+
+def _polygon_data(artist):
+    xy = np.asarray(artist.get_xy(), dtype=float)
+    x = xy[:, 0].copy()
+    y = xy[:, 1].copy()
+
+    return x, y, _histogram_weights(y)
+
+
+def _upper_errors(artist):
+    caplines = artist.lines[1]
+
+    if caplines:
+        return np.asarray(caplines[-1].get_ydata(), dtype=float)
+
+    # no caps, use the upper ends of the error bars
+    segments = np.asarray(artist.lines[2][-1].get_segments(), dtype=float)
+
+    return segments[:, :, 1].max(axis=1)
+
+
+def _errorbar_data(artist):
+    x, y = artist.lines[0].get_data()
+    x = np.array(x, dtype=float)
+    y = np.array(y, dtype=float)
+
+    if artist.has_yerr:
+        # taking only the positive error, assuming it is symmetric
+        with np.errstate(divide='ignore'):
+            weights = 1. / (_upper_errors(artist) - y)
+        weights[np.isinf(weights)] = 0
+    else:
+        weights = np.ones(len(x))
+
+    return x, y, weights
+
+
+def _errorbar_token(artist):
+    token = _line_token(artist.lines[0])
+
+    if artist.has_yerr:
+        if artist.lines[1]:
+            token += _line_token(artist.lines[1][-1])
+        else:
+            token += (artist.lines[2][-1]._paths,)
+
+    return token
+
+
+def _steppatch_data(artist):
+    values, edges = artist.get_data()[:2]
+    edges = np.asarray(edges, dtype=float)
+
+    x = (edges[1:] + edges[:-1]) / 2.
+    y = np.array(values, dtype=float)
+
+    return x, y, _histogram_weights(y)
+
+
+def _polycollection_data(artist):
+    # fill_between: every path is one segment between missing values and
+    # consists of the start point, the upper curve, the end point and the
+    # lower curve in reverse order; the upper curves are taken as data
+    upper = []
+
+    for path in artist.get_paths():
+        verts = path.vertices
+        n = (len(verts) - 3) // 2
+        upper.append(verts[1:n + 1])
+
+    if upper:
+        upper = np.concatenate(upper)
+    else:
+        upper = np.empty((0, 2))
+
+    x = np.array(upper[:, 0], dtype=float)
+    y = np.array(upper[:, 1], dtype=float)
+
+    return x, y, _histogram_weights(y)
+
+
+def _scatter_data(artist):
+    offsets = np.asarray(artist.get_offsets(), dtype=float)
+    x = offsets[:, 0].copy()
+    y = offsets[:, 1].copy()
+
+    return x, y, np.ones(len(x))
+
+
+def _get_extractor(artist):
+    '''Get the extraction function and the change token of *artist*'''
+    if type(artist) == mpl.lines.Line2D:
+        if hasattr(artist, 'lod'):
+            token = (artist.lod.pyramid, len(artist.lod.pyramid))
+        else:
+            token = _line_token(artist)
+        return _line_data, token
+    elif type(artist) == mpl.container.BarContainer:
+        return _bar_data, _bar_token(artist)
+    elif type(artist) == mpl.patches.Polygon:
+        return _polygon_data, (artist.get_path(),)
+    elif type(artist) == mpl.container.ErrorbarContainer:
+        return _errorbar_data, _errorbar_token(artist)
+    elif StepPatch is not None and type(artist) == StepPatch:
+        return _steppatch_data, (artist._values, artist._edges)
+    elif isinstance(artist, PolyCollection):
+        return _polycollection_data, (artist._paths,)
+    elif isinstance(artist, PathCollection):
+        return _scatter_data, (artist._offsets,)
+    else:
+        msg = 'get_data is not implemented for {0}'.format(type(artist))
+        raise NotImplementedError(msg)
+
+
+def _same(a, b):
+    if isinstance(a, int):
+        return a == b
+
+    return a is b
+
+
+def _same_token(token1, token2):
+    return (len(token1) == len(token2) and
+            all(_same(a, b) for a, b in zip(token1, token2)))
+
+
+def is_supported(artist):
+    '''Check if get_data can handle *artist*'''
+    try:
+        _get_extractor(artist)
+    except NotImplementedError:
+        return False
+
+    return True
+
+
+def get_data(artist):
+    '''
+    Get x, y and weights of the data shown by *artist*.
+
+    The returned arrays are cached and must not be modified, they are
+    therefore read-only.
+
+    Returns
+    -------
+    x, y, weights : numpy.ndarray
+    '''
+    extract, token = _get_extractor(artist)
+    key = _cache_key(artist)
+
+    if key is not None:
+        # the entry must not refer to the artist, it would never be dropped
+        entries = _cache.setdefault(key, {})
+
+        try:
+            cached_token, data = entries[type(artist)]
+        except KeyError:
+            pass
+        else:
+            if _same_token(token, cached_token):
+                return data
+
+    data = extract(artist)
+
+    for array in data:
+        array.setflags(write=False)
+
+    if key is not None:
+        entries[type(artist)] = (token, data)
+
+    return data
+
+
+def _cache_key(artist):
+    if isinstance(artist, mpl.container.Container):
+        # the first child, without listing all of them
+        children = (child for child in flatten(artist) if child is not None)
+
+        return next(children, None)
+
+    return artist
+
+
+def invalidate(artist=None):
+    '''
+    Drop the cached data of *artist*, or of all artists if None.
+
+    Only needed if the data of an artist has been changed in place.
+    '''
+    if artist is None:
+        _cache.clear()
+        return
+
+    key = _cache_key(artist)
+
+    if key is not None:
+        _cache.get(key, {}).pop(type(artist), None)
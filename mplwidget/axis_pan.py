@@ -16,8 +16,9 @@ class AxisPan(object):
         self.y = event.y
         self.button = event.button
         self.axes = axes
+        self.region = None
 
-    def drag(self, event):
+    def _deltas(self, event):
         key = event.key
 
         def format_deltas(key, dx, dy):
@@ -44,11 +45,62 @@ class AxisPan(object):
         dx = event.x - self.x
         dy = event.y - self.y
 
+        if dx == 0 and dy == 0:
+            return 0, 0
+
+        return format_deltas(key, dx, dy)
+
+    def drag(self, event):
+        dx, dy = self._deltas(event)
+
         if dx == 0 and dy == 0:
             return
 
-        dx, dy = format_deltas(key, dx, dy)
         result = self.bbox.translated(-dx, -dy).transformed(self.trans_inverse)
 
         self.axes.set_xlim(*result.intervalx)
         self.axes.set_ylim(*result.intervaly)
+
+    def grab(self, canvas):
+        """
+        Cache the current pixels of the axes.
+
+        Has to be called while the canvas still shows the state at press
+        time, i.e. before the first call to *drag*.
+        """
+        self.region = canvas.copy_from_bbox(self.bbox)
+
+    def blit(self, canvas, event):
+        """
+        Show the pan by translating the cached pixels instead of redrawing.
+
+        The area uncovered by the translation is filled with the axes
+        background. The canvas background has to be restored by the caller
+        before and the axes bbox has to be blitted afterwards.
+        """
+        dx, dy = self._deltas(event)
+        dx, dy = int(round(dx)), int(round(dy))
+
+        self.axes.draw_artist(self.axes.patch)
+
+        # restore_region works on buffer coordinates, where the origin is
+        # in the upper left corner, so y has to be flipped
+        height = canvas.figure.bbox.height
+        x0, x1 = int(self.bbox.x0), int(self.bbox.x1)
+        y0, y1 = int(height - self.bbox.y1), int(height - self.bbox.y0)
+        dy = -dy
+
+        sx0 = x0 + max(-dx, 0)
+        sx1 = x1 - max(dx, 0)
+        sy0 = y0 + max(-dy, 0)
+        sy1 = y1 - max(dy, 0)
+
+        if sx1 <= sx0 or sy1 <= sy0:
+            # dragged the whole content out of the axes
+            return
+
+        # xy is the new position of the origin of the whole cached region,
+        # bbox selects the part of it which stays inside the axes
+        canvas.restore_region(self.region,
+                              bbox=(sx0, sy0, sx1, sy1),
+                              xy=(x0 + dx, y0 + dy))
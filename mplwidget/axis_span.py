@@ -7,6 +7,8 @@ Created on Wed Feb  1 11:35:48 2012
 from matplotlib.patches import Rectangle
 from matplotlib.transforms import blended_transform_factory
 
+from .redraw import is_redrawn, request_redraw
+
 
 class AxisSpan(object):
     """
@@ -110,7 +112,7 @@ class AxisSpan(object):
 
     def update_background(self, event):
         'force an update of the background'
-        if self.useblit:
+        if self.useblit and is_redrawn(event, self.ax):
             self.background = self.canvas.copy_from_bbox(self.ax.bbox)
 
     def ignore(self, event):
@@ -131,7 +133,7 @@ class AxisSpan(object):
         except:
             pass
 
-        self.canvas.draw()
+        request_redraw(self.canvas)
         vmin = self.pressv
         if self.direction == 'horizontal':
             vmax = event.x or self.prev[0]
@@ -175,7 +177,7 @@ class AxisSpan(object):
                 self.ax.draw_artist(self.rect2)
             self.canvas.blit(self.ax.bbox)
         else:
-            self.canvas.draw_idle()
+            request_redraw(self.canvas)
 
         return False
 
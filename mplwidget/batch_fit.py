@@ -0,0 +1,97 @@
+'''
+Fitting one model to many data sets in parallel processes.
+'''
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import copy
+import multiprocessing
+
+from .model_widget import build_model
+from .result_widget import ResultContainer, get_result_state, rebuild_result
+
+
+def _fit_task(description, params, x, y, w, fit_kws):
+    model = build_model(description)
+    result = model.fit(y, params=params, x=x, weights=w, **fit_kws)
+
+    return result.params, get_result_state(result)
+
+
+def batch_fit(model, datasets, max_workers=None, iter_cb=None,
+              poll_interval=0.1, **fit_kws):
+    '''
+    Fit a model to several data sets using a process pool.
+
+    The worker processes are started with the spawn method, forking the
+    threads of a running Qt application may deadlock.
+
+    Parameters
+    ----------
+    model : ModelContainer
+        Model to fit, its current parameters are used as start values.
+    datasets : list(tuple)
+        (x, y, weights) of every data set.
+    max_workers : int
+        Number of processes, by default the number of CPUs.
+    iter_cb : function
+        Called as iter_cb(None, n, None) while n fits have finished, at
+        least every *poll_interval* seconds. The remaining fits are
+        cancelled if it returns True, fits which are already running are
+        not waited for. This way the batch fit can be run by a FitWorker.
+    fit_kws :
+        Passed on to lmfit.Model.fit.
+
+    Returns
+    -------
+    results : list(ResultContainer)
+        One result per data set, None if the fit failed or was cancelled.
+    errors : list(tuple)
+        (index, message) of every failed fit.
+    '''
+    description = model.describe()
+    params = copy.deepcopy(model.get_parameters())
+    results = [None] * len(datasets)
+    errors = []
+
+    pool = ProcessPoolExecutor(max_workers=max_workers,
+                               mp_context=multiprocessing.get_context('spawn'))
+    futures = {}
+
+    try:
+        for i, (x, y, w) in enumerate(datasets):
+            future = pool.submit(_fit_task, description, params, x, y, w,
+                                 fit_kws)
+            futures[future] = i
+
+        pending = set(futures)
+
+        while pending:
+            done, pending = wait(pending, timeout=poll_interval,
+                                 return_when=FIRST_COMPLETED)
+
+            for future in done:
+                i = futures[future]
+
+                try:
+                    best, state = future.result()
+                except Exception as exc:
+                    errors.append((i, '{0}: {1}'.format(type(exc).__name__,
+                                                        exc)))
+                else:
+                    x, y, w = datasets[i]
+                    result = rebuild_result(model.model, best, state,
+                                            init_params=params, data=y,
+                                            weights=w, x=x)
+                    results[i] = ResultContainer(result)
+
+            finished = len(futures) - len(pending)
+
+            if iter_cb is not None and iter_cb(None, finished, None):
+                break
+    finally:
+        for future in futures:
+            future.cancel()
+
+        pool.shutdown(wait=False)
+
+    return results, errors
@@ -0,0 +1,184 @@
+'''
+Cache of fit results.
+
+A fit is identified by the structure of the model, a fingerprint of the
+data, the fit range and the start parameters. Fitting again with the same
+inputs gives the cached result, fits with slightly different range or start
+values are started from the nearest cached result.
+'''
+
+from collections import namedtuple, OrderedDict
+import hashlib
+
+import numpy as np
+
+
+# number of elements of large arrays sampled for the fingerprint
+SAMPLE_SIZE = 4096
+
+FitKey = namedtuple('FitKey', ['model', 'data', 'range', 'params',
+                               'options'])
+
+
+def fingerprint(*arrays):
+    '''
+    Cheap fingerprint of *arrays*.
+
+    Large arrays are not hashed completely: besides shape and dtype, an
+    evenly strided sample and the sum of all elements are hashed, so the
+    cost is dominated by a single vectorised pass over the data.
+    '''
+    digest = hashlib.sha1()
+
+    for array in arrays:
+        array = np.asarray(array)
+        digest.update(repr((array.dtype.str, array.shape)).encode('ascii'))
+
+        flat = array.ravel()
+
+        if flat.size > SAMPLE_SIZE:
+            step = flat.size // SAMPLE_SIZE
+            digest.update(np.ascontiguousarray(flat[::step]).tobytes())
+            digest.update(flat[-1:].tobytes())
+
+            with np.errstate(all='ignore'):
+                digest.update(np.add.reduce(flat, dtype=float).tobytes())
+        else:
+            digest.update(np.ascontiguousarray(flat).tobytes())
+
+    return digest.hexdigest()
+
+
+def _model_key(model):
+    return tuple(('{0}.{1}'.format(cls.__module__, cls.__name__), prefix,
+                  repr(args))
+                 for cls, prefix, args in model.describe())
+
+
+def _params_key(params):
+    return tuple((name, par.value, par.min, par.max, par.vary, par.expr)
+                 for name, par in params.items())
+
+
+def _relative_change(new, old, scale=None):
+    if new == old:
+        return 0.
+
+    if scale is None:
+        scale = max(abs(new), abs(old))
+
+    if not np.isfinite(new - old) or scale == 0:
+        return np.inf
+
+    return abs(new - old) / scale
+
+
+class FitCache(object):
+    '''
+    LRU cache of the latest *capacity* fit results.
+
+    A cached result is used as start point of a fit if the start values
+    and range bounds differ by at most *tolerance* relative to the old
+    values and the data range respectively.
+    '''
+    def __init__(self, capacity=32, tolerance=0.1):
+        self.capacity = capacity
+        self.tolerance = tolerance
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def make_key(self, model, data, range_, params, options=None):
+        '''
+        Get the key of a fit of *model* (ModelContainer) to *data* (x, y,
+        weights) within *range_* (Range or None) starting at *params*.
+        *options* is a dict of further settings of the fit.
+        '''
+        intervals = None if range_ is None else tuple(range_.intervals())
+        options = tuple(sorted((options or {}).items()))
+
+        return FitKey(_model_key(model), fingerprint(*data), intervals,
+                      _params_key(params), options)
+
+    def get(self, key):
+        '''Get the ResultContainer cached for *key* or None'''
+        try:
+            container = self._entries.pop(key)
+        except KeyError:
+            return None
+
+        self._entries[key] = container
+
+        return container
+
+    def add(self, key, container):
+        self._entries.pop(key, None)
+        self._entries[key] = container
+
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _range_distance(self, new, old, scale):
+        if new is None or old is None:
+            return 0. if new == old else np.inf
+
+        if len(new) != len(old):
+            return np.inf
+
+        bounds = zip(np.ravel(new).tolist(), np.ravel(old).tolist())
+
+        return max([_relative_change(a, b, scale) for a, b in bounds] or [0.])
+
+    def _params_distance(self, new, old):
+        # only the start values may differ, not which parameters vary
+        if [p[:1] + p[2:] for p in new] != [p[:1] + p[2:] for p in old]:
+            return np.inf
+
+        return max([_relative_change(a[1], b[1]) for a, b in zip(new, old)
+                    if a[4] and a[5] is None] or [0.])
+
+    def nearest(self, key, scale):
+        '''
+        Get the cached ResultContainer of the same model and data which is
+        closest to *key* or None if none is close enough. *scale* is the
+        extent of the data in x.
+        '''
+        best = None
+        distance = self.tolerance
+
+        for other, container in self._entries.items():
+            if (other.model != key.model or other.data != key.data or
+                    other.options != key.options):
+                continue
+
+            d = max(self._range_distance(key.range, other.range, scale),
+                    self._params_distance(key.params, other.params))
+
+            if d <= distance:
+                best = container
+                distance = d
+
+        return best
+
+
+def warm_start(params, result):
+    '''
+    Set the start values of the varying parameters in *params* to the
+    best fit values of *result*, clipped to their bounds.
+    '''
+    for name, par in params.items():
+        if not par.vary or par.expr is not None:
+            continue
+
+        try:
+            value = result.params[name].value
+        except KeyError:
+            continue
+
+        par.value = min(max(value, par.min), par.max)
+
+    return params
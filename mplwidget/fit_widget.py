@@ -5,15 +5,29 @@ Created on Feb 9, 2015
 '''
 
 import __main__
+import copy
+import sqlite3
 import numpy as np
+from .artist_data import get_data, is_supported
 from .axis_span import AxisSpan
+from .batch_fit import batch_fit
+from .fit_cache import FitCache, warm_start
+from .fit_worker import FitWorker
+from .global_fit import global_fit
+from .redraw import request_redraw
 from .model_widget import ModelWidget
+from .multires import multires_fit
 from .parameter_widget import ParameterWidget
+from .peak_guess import guess_peaks
+from .preview import ModelPreview
+from .ranges import Range
 from .collabpsible_widget import CollapsibleWidget
 from .result_widget import ResultWidget, ResultContainer
+from .results_store import get_default_store
+from .session import load_session, save_session
 
 import matplotlib as mpl
-from matplotlib.backends.qt_compat import QtGui
+from matplotlib.backends.qt_compat import QtCore, QtGui
 
 # needed for compatibility with PyQt5
 try:
@@ -33,7 +47,7 @@ def store_in_namespace(result):
         print('WARNING: overwriting FITRESULT in local namespace')
         fr = {}
 
-    fr[result.name] = result.result
+    fr[result.name] = result
 
 
 def get_axes(artist):
@@ -50,6 +64,11 @@ def get_axes(artist):
     return axes
 
 
+def _data_label(artist):
+    # results are stored and listed by the label of the fitted data
+    return None if artist is None else artist.get_label()
+
+
 def get_line(axes, name):
     for line in axes.get_lines():
         if line.get_label() == name:
@@ -58,40 +77,31 @@ def get_line(axes, name):
     raise AttributeError
 
 
-def get_data(artist):
-    if type(artist) == mpl.lines.Line2D:
-        x, y = artist.get_data()
-        weights = np.ones(len(x))
-    elif type(artist) == mpl.container.BarContainer:
-        x = np.array([p.get_x() for p in artist.patches])
-        w = np.array([p.get_width() for p in artist.patches])
-        x += w / 2.
-        y = np.array([p.get_height() for p in artist.patches])
-
-        # using sqrt(y) assuming this is a bar histogram
-        weights = 1. / np.sqrt(y)
-        weights[np.isinf(weights)] = 0
-    elif type(artist) == mpl.patches.Polygon:
-        x, y = zip(*artist.get_xy())
-        x = np.array(x)
-        y = np.array(y)
-
-        # using sqrt(y) assuming this is a step histogram
-        weights = 1. / np.sqrt(y)
-    elif type(artist) == mpl.container.ErrorbarContainer:
-        x, y = artist.lines[0].get_data()
+def get_fit_artists(axes):
+    '''
+    Get all artists of *axes* which can be handed to get_data.
 
-        if artist.has_yerr:
-            # taking only the positive error, assuming it is symmetric
-            weights = 1. / (artist.lines[1][-1].get_ydata() - y)
-            weights[np.isinf(weights)] = 0
-        else:
-            weights = np.ones(len(x))
-    else:
-        msg = 'get_data is not implemented for {0}'.format(type(artist))
-        raise NotImplementedError(msg)
+    Lines which are part of a container (e.g. error bars) are represented
+    by their container, artists with labels starting with an underscore
+    are skipped.
+    '''
+    artists = list(axes.containers)
+    in_container = set()
+
+    for container in axes.containers:
+        in_container.update(container.get_children())
+
+    candidates = (list(axes.get_lines()) + list(axes.patches) +
+                  list(axes.collections))
+
+    for artist in candidates:
+        if artist in in_container or artist.get_label().startswith('_'):
+            continue
 
-    return x, y, weights
+        if is_supported(artist):
+            artists.append(artist)
+
+    return artists
 
 
 def markup(txt):
@@ -110,6 +120,13 @@ class FitWidget(QtWidgets.QDialog):
         self.artist = artist
         self.model_dict = {}
         self.range_ = None
+        self.preview = None
+        # name of the model shown in the parameter widget
+        self._parwidgetModel = None
+        # the store is created when the first result is stored
+        self.store = get_default_store(create=False)
+        self.fit_cache = FitCache()
+        self._workers = []
 
         super(FitWidget, self).__init__(parent=parent)
 
@@ -130,10 +147,18 @@ class FitWidget(QtWidgets.QDialog):
         self.editButton.clicked.connect(self.edit_model)
         self.editButton.setEnabled(False)
 
+        saveButton = QtWidgets.QPushButton('&Save ...')
+        saveButton.clicked.connect(self.save_session)
+
+        loadButton = QtWidgets.QPushButton('&Load ...')
+        loadButton.clicked.connect(self.load_session)
+
         modelLayout = QtWidgets.QHBoxLayout()
         modelLayout.addWidget(self.modelCombo, stretch=1)
         modelLayout.addWidget(newButton, stretch=0)
         modelLayout.addWidget(self.editButton)
+        modelLayout.addWidget(saveButton)
+        modelLayout.addWidget(loadButton)
 
         layout.addItem(modelLayout)
 
@@ -146,7 +171,8 @@ class FitWidget(QtWidgets.QDialog):
 
         layout.addWidget(cw, stretch=0)
 
-        self.result_widget = ResultWidget(parent=self)
+        self.result_widget = ResultWidget(parent=self, store=self.store,
+                                          data_label=_data_label(artist))
 
         cw = CollapsibleWidget()
         cw.setTitle('Results')
@@ -159,10 +185,43 @@ class FitWidget(QtWidgets.QDialog):
         rngButton = QtWidgets.QPushButton('Select &Range')
         rngButton.clicked.connect(self.get_range)
 
+        excludeButton = QtWidgets.QPushButton('E&xclude')
+        excludeButton.clicked.connect(self.exclude_range)
+
+        clearRangeButton = QtWidgets.QPushButton('Cle&ar Range')
+        clearRangeButton.clicked.connect(self.clear_range)
+
+        batchButton = QtWidgets.QPushButton('&Batch ...')
+        batchButton.clicked.connect(self.batch_fit)
+
+        globalButton = QtWidgets.QPushButton('&Global ...')
+        globalButton.clicked.connect(self.global_fit)
+
+        self.cancelButton = QtWidgets.QPushButton('Ca&ncel')
+        self.cancelButton.clicked.connect(self.cancel_fits)
+        self.cancelButton.setEnabled(False)
+
+        self.statusLabel = QtWidgets.QLabel()
+
+        self.previewCheck = QtWidgets.QCheckBox('&Preview')
+        self.previewCheck.toggled.connect(self.update_preview)
+
+        self.multiresCheck = QtWidgets.QCheckBox('Coarse &to fine')
+        self.multiresCheck.setToolTip('Fit rebinned data first, for large '
+                                      'data sets')
+
         fbLayout = QtWidgets.QHBoxLayout()
+        fbLayout.addWidget(self.statusLabel)
         fbLayout.addStretch()
+        fbLayout.addWidget(self.previewCheck)
+        fbLayout.addWidget(self.multiresCheck)
         fbLayout.addWidget(rngButton)
+        fbLayout.addWidget(excludeButton)
+        fbLayout.addWidget(clearRangeButton)
         fbLayout.addWidget(fitButton)
+        fbLayout.addWidget(batchButton)
+        fbLayout.addWidget(globalButton)
+        fbLayout.addWidget(self.cancelButton)
 
         layout.addItem(fbLayout)
 
@@ -184,6 +243,8 @@ class FitWidget(QtWidgets.QDialog):
         self.print_text = self.textBox.append
 
     def guess(self):
+        self.parameter_widget.flushChanges()
+
         try:
             name = str(self.modelCombo.currentText())
             model = self.model_dict[name]
@@ -193,7 +254,7 @@ class FitWidget(QtWidgets.QDialog):
             return
 
         label = 'How should the start values be guessed?'
-        choices = ['full range', 'global subrange']
+        choices = ['full range', 'global subrange', 'automatic']
 
         if len(model.get_components()) > 1:
             choices.append('component subrange')
@@ -222,11 +283,11 @@ class FitWidget(QtWidgets.QDialog):
             dlg = RangeSelector(get_axes(self.artist), parent=self)
 
             def cb():
-                sel = (x > dlg.xmin) & (x < dlg.xmax)
+                x_sel, y_sel = Range(dlg.xmin, dlg.xmax).select(x, y)
                 guess = model.get_parameters()
 
                 for comp in model.get_components():
-                    guess.update(comp.guess(y[sel], x=x[sel]))
+                    guess.update(comp.guess(y_sel, x=x_sel))
 
                 model.parameters = guess
                 self.update_parwidget(0)
@@ -249,8 +310,8 @@ class FitWidget(QtWidgets.QDialog):
                                     parent=self, msg=msg)
 
                 def cb():
-                    sel = (x > dlg.xmin) & (x < dlg.xmax)
-                    guess.update(comp.guess(y[sel], x=x[sel]))
+                    x_sel, y_sel = Range(dlg.xmin, dlg.xmax).select(x, y)
+                    guess.update(comp.guess(y_sel, x=x_sel))
 
                     try:
                         call_next()
@@ -265,6 +326,19 @@ class FitWidget(QtWidgets.QDialog):
 
             call_next()
 
+        elif text == 'automatic':
+            if self.range_ is not None:
+                x, y = self.range_.select(x, y)
+
+            guess, missing = guess_peaks(model, x, y)
+
+            for comp in missing:
+                self.print_text('no peak found for component {0}'.format(
+                    comp.name))
+
+            model.set_parameters(guess)
+            self.update_parwidget(0)
+
         else:
             print('this should never happen')
             return
@@ -273,14 +347,17 @@ class FitWidget(QtWidgets.QDialog):
         self.editButton.setEnabled(True)
 
     def update_parameters(self):
+        # the combo box may show another model already, see update_parwidget
         try:
-            name = str(self.modelCombo.currentText())
-            model = self.model_dict[name]
+            model = self.model_dict[self._parwidgetModel]
         except KeyError:
             QtWidgets.QMessageBox.warning(self, 'Ooops...',
                                           'Please create a model')
+            return
 
-        model.update_parameters(self.parameter_widget.getValues())
+        # only the parameters edited since the last update are applied
+        model.update_parameters(self.parameter_widget.takeChanges())
+        self.update_preview()
 
     def update_parwidget(self, *args):
         try:
@@ -290,7 +367,43 @@ class FitWidget(QtWidgets.QDialog):
             return
 
         pars = model.get_parameters()
+        # pending edits are applied to the model shown so far first
         self.parameter_widget.updateParameters(pars)
+        self._parwidgetModel = name
+        self.update_preview()
+
+    def update_preview(self, *args):
+        '''Show the selected model with its start values over the data'''
+        try:
+            name = str(self.modelCombo.currentText())
+            model = self.model_dict[name]
+        except KeyError:
+            model = None
+
+        if (not self.previewCheck.isChecked() or model is None or
+                self.artist is None):
+            self.remove_preview()
+            return
+
+        axes = get_axes(self.artist)
+
+        if self.preview is not None and (self.preview.model is not model or
+                                         self.preview.axes is not axes):
+            self.remove_preview()
+
+        if self.preview is None:
+            self.preview = ModelPreview(axes, model)
+        else:
+            self.preview.update()
+
+    def remove_preview(self):
+        if self.preview is not None:
+            self.preview.remove()
+            self.preview = None
+
+    def closeEvent(self, event):
+        self.remove_preview()
+        super(FitWidget, self).closeEvent(event)
 
     def update_resultwidget(self, *args):
         try:
@@ -323,7 +436,53 @@ class FitWidget(QtWidgets.QDialog):
             self.modelCombo.clear()
             self.modelCombo.addItems(list(self.model_dict.keys()))
 
+    def save_session(self):
+        self.parameter_widget.flushChanges()
+        path = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Save Fit Session', '', 'Fit sessions (*.mpls)')
+
+        # PyQt5 returns the selected filter as well
+        if isinstance(path, tuple):
+            path = path[0]
+
+        if not path:
+            return
+
+        try:
+            save_session(str(path), self.model_dict, self.range_)
+        except (IOError, OSError, TypeError, ValueError) as exc:
+            QtWidgets.QMessageBox.warning(self, 'Ooops...',
+                                          'Saving failed: {0}'.format(exc))
+
+    def load_session(self):
+        path = QtWidgets.QFileDialog.getOpenFileName(
+            self, 'Load Fit Session', '', 'Fit sessions (*.mpls)')
+
+        if isinstance(path, tuple):
+            path = path[0]
+
+        if not path:
+            return
+
+        try:
+            models, range_ = load_session(str(path))
+        except (IOError, OSError, ValueError) as exc:
+            QtWidgets.QMessageBox.warning(self, 'Ooops...',
+                                          'Loading failed: {0}'.format(exc))
+            return
+
+        self.model_dict.update(models)
+
+        if range_ is not None:
+            self.range_ = range_
+
+        self.modelCombo.clear()
+        self.modelCombo.addItems(list(self.model_dict.keys()))
+        self.print_text('loaded {0} model(s) from {1}'.format(len(models),
+                                                             path))
+
     def fit(self):
+        self.parameter_widget.flushChanges()
         model_name = str(self.modelCombo.currentText())
 
         try:
@@ -341,60 +500,336 @@ class FitWidget(QtWidgets.QDialog):
 
         x, y, w = get_data(self.artist)
 
-        if self.range_ is not None:
-            sel = (x > self.range_.xmin) & (x < self.range_.xmax)
+        self._perform_fit(model, x, y, w, self.range_)
+
+    def _perform_fit(self, model, x, y, w, range_=None):
+        """
+        Start a fit in the background.
+
+        The result is stored and plotted once the fit has finished. Several
+        fits may run at the same time. Fits which were done before are
+        taken from the fit cache, fits close to a cached one start from its
+        result. Large data sets are fitted coarse to fine if enabled.
+        """
+        artist = self.artist
+        x_plot = x
+        multires = self.multiresCheck.isChecked()
+
+        # the parameters may be edited while the fit is running
+        params = copy.deepcopy(model.get_parameters())
+        key = self.fit_cache.make_key(model, (x, y, w), range_, params,
+                                      options={'multires': multires})
+        cached = self.fit_cache.get(key)
+
+        if cached is not None:
+            self.print_text('{0}: cached result'.format(model.name))
+            self.print_text(cached.result.fit_report())
+
+            if model.results.get(cached.name) is cached:
+                self.update_resultwidget()
+            elif not self._restore_fit_result(model, cached, x_plot,
+                                              artist=artist):
+                # the name of the removed result has been given to another
+                # one, it is stored again under a new name
+                result = ResultContainer(cached.result)
+                self._store_fit_result(model, result, artist=artist)
+                self._plot_fit_result(result, x_plot, artist=artist)
+                self.fit_cache.add(key, result)
+
+            return None
+
+        nearest = self.fit_cache.nearest(key, np.ptp(x) if len(x) else 0.)
+
+        if nearest is not None:
+            self.print_text('{0}: starting from {1}'.format(model.name,
+                                                            nearest.name))
+            warm_start(params, nearest.result)
+
+        if range_ is not None:
+            x, y, w = range_.select(x, y, w)
+
+        if multires:
+            worker = FitWorker(multires_fit, model.fit, y, x=x, weights=w,
+                               params=params)
         else:
-            sel = None
+            worker = FitWorker(model.fit, y, x=x, weights=w, params=params)
 
-        result = self._perform_fit(model, x, y, w, sel)
-        self._store_fit_result(model, result)
-        self._plot_fit_result(result, x)
+        def finished(result):
+            result = ResultContainer(result)
+            self.print_text(result.result.fit_report())
+            self._store_fit_result(model, result, artist=artist)
+            self._plot_fit_result(result, x_plot, artist=artist)
+            self.fit_cache.add(key, result)
 
-    def _perform_fit(self, model, x, y, w, sel=None):
-        if sel is None:
-            result = model.fit(y, x=x, weights=w,
-                               params=model.get_parameters())
-        else:
-            result = model.fit(y[sel], x=x[sel], weights=w[sel],
-                               params=model.get_parameters())
+        return self._start_worker(worker, model.name, finished)
 
-        self.print_text(result.fit_report())
+    def batch_fit(self):
+        """
+        Fit the selected model to several artists of the axes at once.
 
-        return ResultContainer(result)
+        The fits are distributed over a process pool and the figure is
+        redrawn once all of them are done.
+        """
+        self.parameter_widget.flushChanges()
+        model_name = str(self.modelCombo.currentText())
+
+        try:
+            model = self.model_dict[model_name]
+        except KeyError:
+            QtWidgets.QMessageBox.warning(self, 'Ooops...',
+                                          'Please create a model')
+            return
+
+        if self.artist is None:
+            QtWidgets.QMessageBox.warning(self, 'Ooops...',
+                                          'No data selected')
+            return
 
-    def _plot_fit_result(self, result, x, show_components=True):
         axes = get_axes(self.artist)
+        dlg = ArtistSelector(get_fit_artists(axes), parent=self)
+
+        if dlg.exec_() != QtWidgets.QDialog.Accepted:
+            return
+
+        artists = dlg.get_selected()
+        datasets = []
+        plot_x = []
+
+        for artist in artists:
+            x, y, w = get_data(artist)
+            plot_x.append(x)
+
+            if self.range_ is not None:
+                x, y, w = self.range_.select(x, y, w)
+
+            datasets.append((x, y, w))
+
+        worker = FitWorker(batch_fit, model, datasets)
+
+        def finished(output):
+            results, errors = output
+
+            for i, message in errors:
+                self.print_text('fit of {0} failed: {1}'.format(
+                    artists[i].get_label(), message))
+
+            for artist, x, result in zip(artists, plot_x, results):
+                if result is None:
+                    continue
+
+                label = artist.get_label().replace('{', '').replace('}', '')
+                name = '{0}_{1}'.format(model.name, label) + '_{0}'
+                self._store_fit_result(model, result, name=name,
+                                       artist=artist)
+                self._plot_fit_result(result, x, artist=artist, redraw=False)
+
+            self.print_text('batch fit of {0}: {1} of {2} fits done'.format(
+                model.name, len(results) - results.count(None), len(results)))
+            request_redraw(axes.figure.canvas)
+
+        return self._start_worker(worker, model.name, finished)
+
+    def global_fit(self):
+        """
+        Fit the selected model to several artists of the axes at once with
+        some parameters shared by all of them.
+
+        Every artist gets its own result, the shared parameters have the
+        same values in all of them.
+        """
+        self.parameter_widget.flushChanges()
+        model_name = str(self.modelCombo.currentText())
+
+        try:
+            model = self.model_dict[model_name]
+        except KeyError:
+            QtWidgets.QMessageBox.warning(self, 'Ooops...',
+                                          'Please create a model')
+            return
+
+        if self.artist is None:
+            QtWidgets.QMessageBox.warning(self, 'Ooops...',
+                                          'No data selected')
+            return
+
+        axes = get_axes(self.artist)
+        dlg = ArtistSelector(get_fit_artists(axes), parent=self)
+
+        if dlg.exec_() != QtWidgets.QDialog.Accepted:
+            return
+
+        artists = dlg.get_selected()
+        params = copy.deepcopy(model.get_parameters())
+        names = [name for name, par in params.items()
+                 if par.vary and par.expr is None]
+        dlg = SharedParameterSelector(names, parent=self)
+
+        if dlg.exec_() != QtWidgets.QDialog.Accepted:
+            return
+
+        shared = dlg.get_selected()
+        datasets = []
+        plot_x = []
+
+        for artist in artists:
+            x, y, w = get_data(artist)
+            plot_x.append(x)
+
+            if self.range_ is not None:
+                x, y, w = self.range_.select(x, y, w)
+
+            datasets.append((x, y, w))
+
+        worker = FitWorker(global_fit, model, datasets, shared, params=params)
+
+        def finished(results):
+            if results and results[0] is not None:
+                self.print_text(results[0].result.fit_report())
+
+            for artist, x, result in zip(artists, plot_x, results):
+                if result is None:
+                    continue
+
+                label = artist.get_label().replace('{', '').replace('}', '')
+                name = '{0}_global_{1}'.format(model.name, label) + '_{0}'
+                self._store_fit_result(model, result, name=name,
+                                       artist=artist)
+                self._plot_fit_result(result, x, artist=artist, redraw=False)
+
+            self.print_text('global fit of {0} to {1} data sets, shared: '
+                            '{2}'.format(model.name, len(results),
+                                         ', '.join(shared) or 'none'))
+            request_redraw(axes.figure.canvas)
+
+        return self._start_worker(worker, model.name, finished)
+
+    def _start_worker(self, worker, name, finished):
+        """
+        Run *worker* in the thread pool and call *finished* with its result
+        in the GUI thread.
+        """
+        def on_finished(result):
+            self._finish_worker(worker)
+            finished(result)
+
+        def progress(iteration):
+            self.statusLabel.setText('{0}: iteration {1}'.format(name,
+                                                                 iteration))
+
+        def cancelled():
+            self._finish_worker(worker)
+            self.print_text('fit of {0} cancelled'.format(name))
+
+        def failed(message):
+            self._finish_worker(worker)
+            self.print_text('fit of {0} failed: {1}'.format(name, message))
+
+        worker.signals.finished.connect(on_finished)
+        worker.signals.progress.connect(progress)
+        worker.signals.cancelled.connect(cancelled)
+        worker.signals.failed.connect(failed)
+
+        self._workers.append(worker)
+        self._update_fit_status()
+        QtCore.QThreadPool.globalInstance().start(worker)
+
+        return worker
+
+    def _finish_worker(self, worker):
+        self._workers.remove(worker)
+        self._update_fit_status()
+
+    def _update_fit_status(self):
+        n = len(self._workers)
+        self.cancelButton.setEnabled(n > 0)
+
+        if n == 0:
+            self.statusLabel.setText('')
+        else:
+            self.statusLabel.setText('{0} fit(s) running'.format(n))
+
+    def cancel_fits(self):
+        for worker in self._workers:
+            worker.cancel()
+
+    def _plot_fit_result(self, result, x, show_components=True, artist=None,
+                         redraw=True):
+        if artist is None:
+            artist = self.artist
+
+        axes = get_axes(artist)
 
         hold_state = axes._hold
         axes.hold(True)
-        lines = axes.plot(x, result.eval(x=x), label=result.name, lw=2)
-        result.set_plot(lines[0])
+        result.draw_curves(axes, x, show_components=show_components)
+        axes.hold(hold_state)
 
-        if result.get_ncomponents() > 1:
-            for data in result.eval_components(x=x).values():
-                line = axes.plot(x, data, '--', color=result.plot.get_color(),
-                                 lw=2, label='_nolegend_')[0]
+        if redraw:
+            self.parent().draw()
 
-                result.add_component_plot(line)
-                line.set_visible(show_components)
+    def _taken_names(self, model, artist=None):
+        '''
+        Get the names of the results of *model* in memory and of those in
+        the store which are listed for the data of *artist* or the data of
+        the widget.
+        '''
+        taken = set(model.results)
 
-        axes.hold(hold_state)
-        self.parent().draw()
+        if self.store is not None:
+            for label in set([_data_label(artist), _data_label(self.artist)]):
+                taken.update(self.store.names(model.name, label))
 
-    def _store_fit_result(self, model, result, name=None):
+        return taken
+
+    def _restore_fit_result(self, model, result, x, artist=None):
+        '''
+        Add a removed *result* to *model* again under its name and with its
+        record in the store. Returns False if the name is taken.
+        '''
+        if result.name in self._taken_names(model, artist):
+            return False
+
+        result.restore()
+        model.add_result(result.name, result)
+        self.update_resultwidget()
+        store_in_namespace(result)
+
+        if result.plot is None or result.plot.axes is None:
+            result.component_plots = []
+            self._plot_fit_result(result, x, artist=artist)
+
+        return True
+
+    def _store_fit_result(self, model, result, name=None, artist=None):
         if name is None:
             name = model.name + '_{0}'
 
+        # the store is created when the first result is stored, before the
+        # names in it are looked up
+        if self.store is None:
+            self.store = get_default_store()
+            self.result_widget.store = self.store
+
+        taken = self._taken_names(model, artist)
         i = 0
 
         while True:
-            if name.format(i) not in model.results:
+            if name.format(i) not in taken:
                 name = name.format(i)
                 break
 
             i += 1
 
         result.name = name
+
+        if self.store is not None:
+            try:
+                result.persist(self.store, model.name, model.describe(),
+                               data_label=_data_label(artist))
+            except (ValueError, sqlite3.Error) as exc:
+                self.print_text('result {0} is not stored: {1}'.format(
+                    name, exc))
+
         model.add_result(name, result)
         self.update_resultwidget()
         store_in_namespace(result)
@@ -403,17 +838,99 @@ class FitWidget(QtWidgets.QDialog):
         dlg = RangeSelector(get_axes(self.artist), parent=self)
 
         def cb():
-            self.range_ = Range(dlg.xmin, dlg.xmax)
+            excluded = [] if self.range_ is None else self.range_.excluded
+            self.range_ = Range(dlg.xmin, dlg.xmax, exclude=excluded)
 
         dlg.accepted.connect(cb)
         # dlg.setModal(True)
         dlg.show()
 
+    def exclude_range(self):
+        msg = 'Click and drag in plot window to select data to exclude'
+        dlg = RangeSelector(get_axes(self.artist), parent=self, msg=msg)
+
+        def cb():
+            if self.range_ is None:
+                self.range_ = Range()
+
+            self.range_.exclude(dlg.xmin, dlg.xmax)
+
+        dlg.accepted.connect(cb)
+        dlg.show()
+
+    def clear_range(self):
+        '''Fit the full data again, without selected or excluded ranges'''
+        self.range_ = None
+
+
+class ArtistSelector(QtWidgets.QDialog):
+    def __init__(self, artists, parent=None):
+        self.artists = artists
+
+        super(ArtistSelector, self).__init__(parent=parent)
+
+        self.setWindowTitle('Select Data ...')
+
+        layout = QtWidgets.QVBoxLayout()
+
+        self.artistList = QtWidgets.QListWidget()
+        self.artistList.setSelectionMode(
+            QtWidgets.QAbstractItemView.ExtendedSelection)
+
+        for artist in artists:
+            self.artistList.addItem(artist.get_label())
+
+        self.artistList.selectAll()
+        layout.addWidget(self.artistList)
+
+        buttons = QtWidgets.QDialogButtonBox(
+            QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel,
+            QtCore.Qt.Horizontal, self)
+
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self.setLayout(layout)
+
+    def get_selected(self):
+        rows = sorted(self.artistList.row(item)
+                      for item in self.artistList.selectedItems())
+
+        return [self.artists[row] for row in rows]
+
+
+class SharedParameterSelector(QtWidgets.QDialog):
+    def __init__(self, names, parent=None):
+        self.names = names
+
+        super(SharedParameterSelector, self).__init__(parent=parent)
+
+        self.setWindowTitle('Select Shared Parameters ...')
+
+        layout = QtWidgets.QVBoxLayout()
+
+        self.parameterList = QtWidgets.QListWidget()
+        self.parameterList.setSelectionMode(
+            QtWidgets.QAbstractItemView.MultiSelection)
+        self.parameterList.addItems(names)
+        layout.addWidget(self.parameterList)
+
+        buttons = QtWidgets.QDialogButtonBox(
+            QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel,
+            QtCore.Qt.Horizontal, self)
+
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self.setLayout(layout)
+
+    def get_selected(self):
+        rows = sorted(self.parameterList.row(item)
+                      for item in self.parameterList.selectedItems())
 
-class Range(object):
-    def __init__(self, xmin, xmax):
-        self.xmin = xmin
-        self.xmax = xmax
+        return [self.names[row] for row in rows]
 
 
 class RangeSelector(QtWidgets.QDialog):
@@ -0,0 +1,77 @@
+'''
+Running fits in the background, so the GUI stays responsive.
+'''
+
+import time
+
+from matplotlib.backends.qt_compat import QtCore
+
+
+class FitSignals(QtCore.QObject):
+    progress = QtCore.Signal(int)
+    finished = QtCore.Signal(object)
+    cancelled = QtCore.Signal()
+    failed = QtCore.Signal(str)
+
+
+class FitWorker(QtCore.QRunnable):
+    '''
+    Run a fit function in a thread of a QThreadPool.
+
+    *func* is called with the given arguments and an additional keyword
+    argument *iter_cb*, which has to be handed to lmfit, e.g.::
+
+        worker = FitWorker(model.fit, y, x=x, params=params)
+        worker.signals.finished.connect(show_result)
+        QtCore.QThreadPool.globalInstance().start(worker)
+
+    The signals are emitted from the worker thread, connected slots of
+    objects living in the GUI thread are called in the GUI thread.
+    Progress is reported at most every *progress_interval* seconds.
+    '''
+    def __init__(self, func, *args, **kwargs):
+        self.progress_interval = kwargs.pop('progress_interval', 0.1)
+
+        super(FitWorker, self).__init__()
+
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = FitSignals()
+
+        # the python object is kept alive by the caller
+        self.setAutoDelete(False)
+
+        self._cancelled = False
+        self._lastProgress = 0.
+
+    def cancel(self):
+        '''Stop the fit after the current iteration'''
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def _iter_cb(self, params, iteration, resid, *args, **kwargs):
+        now = time.time()
+
+        if now - self._lastProgress > self.progress_interval:
+            self._lastProgress = now
+            self.signals.progress.emit(iteration)
+
+        # returning True aborts the fit
+        return self._cancelled
+
+    def run(self):
+        try:
+            result = self.func(*self.args, iter_cb=self._iter_cb,
+                               **self.kwargs)
+        except Exception as exc:
+            self.signals.failed.emit('{0}: {1}'.format(type(exc).__name__,
+                                                       exc))
+            return
+
+        if self._cancelled:
+            self.signals.cancelled.emit()
+        else:
+            self.signals.finished.emit(result)
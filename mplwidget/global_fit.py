@@ -0,0 +1,286 @@
+'''
+Simultaneous fit of one model to several data sets with shared parameters.
+
+Every data set has its own copy of the varying parameters except for the
+shared ones, which are the same for all data sets. The residuals of all
+data sets are minimised together with scipy.optimize.least_squares. The
+residuals of a data set only depend on the shared and its own parameters,
+so the Jacobian is block sparse: with the sparsity pattern, finite
+differences need as many evaluations as one data set has parameters and
+the trust region steps are solved iteratively, so the cost of the fit
+grows linearly with the number of data sets.
+'''
+
+import copy
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import least_squares
+
+from .result_widget import ResultContainer, rebuild_result
+
+
+class _Abort(Exception):
+    pass
+
+
+class GlobalProblem(object):
+    '''
+    Parameter layout and residuals of a global fit.
+
+    The parameter vector holds the shared parameters followed by the local
+    parameters of every data set.
+    '''
+    def __init__(self, model, datasets, shared, params):
+        self.model = model
+        self.datasets = datasets
+        self.params = params
+
+        var_names = [name for name, par in params.items()
+                     if par.vary and par.expr is None]
+
+        self.var_names = var_names
+        self.shared = [name for name in var_names if name in shared]
+        self.local = [name for name in var_names if name not in shared]
+
+        sizes = [len(y) for x, y, w in datasets]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(int)
+
+        # parameters of every data set, the values are set before
+        # evaluating the model
+        self.dataset_params = [copy.deepcopy(params) for d in datasets]
+
+    @property
+    def nshared(self):
+        return len(self.shared)
+
+    @property
+    def nlocal(self):
+        return len(self.local)
+
+    def columns(self, i):
+        '''Indices of the parameters of data set *i* in the vector'''
+        start = self.nshared + i * self.nlocal
+
+        return np.r_[np.arange(self.nshared),
+                     np.arange(start, start + self.nlocal)]
+
+    def _pack(self, attr):
+        values = [getattr(self.params[name], attr) for name in self.shared]
+        local = [getattr(self.params[name], attr) for name in self.local]
+
+        return np.array(values + local * len(self.datasets), dtype=float)
+
+    def start_values(self):
+        lower, upper = self._pack('min'), self._pack('max')
+
+        return np.clip(self._pack('value'), lower, upper), (lower, upper)
+
+    def set_values(self, p, i):
+        '''Set the values of the parameters of data set *i*'''
+        params = self.dataset_params[i]
+
+        for name, value in zip(self.shared + self.local,
+                               p[self.columns(i)].tolist()):
+            params[name].value = value
+
+        return params
+
+    def residual(self, p, i):
+        x, y, w = self.datasets[i]
+        params = self.set_values(p, i)
+
+        return (self.model.eval(params, x=x) - y) * w
+
+    def sparsity(self):
+        '''Block pattern of the Jacobian'''
+        blocks = [np.ones((len(y), self.nlocal)) for x, y, w in self.datasets]
+        local = sparse.block_diag(blocks, format='csr')
+
+        if self.nshared == 0:
+            return local
+
+        shared = np.ones((self.offsets[-1], self.nshared))
+
+        return sparse.hstack([shared, local], format='csr')
+
+    def covariance(self, jac, scale):
+        '''
+        Get the covariance matrix of the parameters of every data set.
+
+        The shared parameters are eliminated with the Schur complement of
+        the block diagonal local part of J^T J, so only matrices of the
+        size of the parameters of one data set are inverted. Returns None
+        if J^T J is singular.
+        '''
+        jac = sparse.csr_matrix(jac)
+        ns = self.nshared
+        a = np.zeros((ns, ns))
+        blocks = []
+
+        for i in range(len(self.datasets)):
+            rows = jac[self.offsets[i]:self.offsets[i + 1]]
+            j = rows[:, self.columns(i)].toarray()
+            h = j.T.dot(j)
+            a += h[:ns, :ns]
+
+            try:
+                d_inv = np.linalg.inv(h[ns:, ns:])
+            except np.linalg.LinAlgError:
+                return None
+
+            blocks.append((h[:ns, ns:], d_inv))
+
+        schur = a - sum(b.dot(d_inv).dot(b.T) for b, d_inv in blocks)
+
+        try:
+            s_inv = np.linalg.inv(schur) if ns else schur
+        except np.linalg.LinAlgError:
+            return None
+
+        covariances = []
+
+        for b, d_inv in blocks:
+            cross = -s_inv.dot(b).dot(d_inv)
+            cov = np.block([[s_inv, cross],
+                            [cross.T, d_inv + d_inv.dot(b.T).dot(s_inv).dot(
+                                b).dot(d_inv)]])
+            covariances.append(cov * scale)
+
+        return covariances
+
+
+def _result_state(problem, i, residual, init_params, covar, opt):
+    x, y, w = problem.datasets[i]
+    params = problem.dataset_params[i]
+    names = problem.shared + problem.local
+
+    # covariance and parameters in the order of the model parameters
+    order = [names.index(name) for name in problem.var_names]
+
+    for name in problem.var_names:
+        params[name].init_value = init_params[name].value
+
+    if covar is not None:
+        covar = covar[np.ix_(order, order)]
+        stderr = np.sqrt(np.abs(np.diag(covar)))
+
+        for k, name in enumerate(problem.var_names):
+            par = params[name]
+            par.stderr = stderr[k]
+            par.correl = {}
+
+            for l, other in enumerate(problem.var_names):
+                if l != k and stderr[k] > 0 and stderr[l] > 0:
+                    par.correl[other] = covar[k, l] / (stderr[k] * stderr[l])
+
+    ndata = len(y)
+    nvarys = len(names)
+    chisqr = float(np.sum(residual ** 2))
+    nfree = max(ndata - nvarys, 1)
+    sstot = np.sum(((y - np.mean(y)) * w) ** 2)
+
+    with np.errstate(divide='ignore'):
+        neg2_log_likel = ndata * np.log(chisqr / ndata)
+
+    init_values = init_params.valuesdict()
+    best_fit = problem.model.eval(params, x=x)
+
+    return {'method': 'least_squares',
+            'nfev': opt.nfev,
+            'success': opt.success,
+            'message': opt.message,
+            'ier': None,
+            'lmdif_message': None,
+            'errorbars': covar is not None,
+            'aborted': False,
+            'chisqr': chisqr,
+            'redchi': chisqr / nfree,
+            'aic': neg2_log_likel + 2 * nvarys,
+            'bic': neg2_log_likel + np.log(ndata) * nvarys,
+            'rsquared': 1. - chisqr / max(sstot, np.finfo(float).tiny),
+            'ndata': ndata,
+            'nvarys': nvarys,
+            'nfree': nfree,
+            'var_names': list(problem.var_names),
+            'covar': covar,
+            'init_vals': [init_values[name] for name in problem.var_names],
+            'init_values': init_values,
+            'best_values': params.valuesdict(),
+            'best_fit': best_fit,
+            'init_fit': problem.model.eval(init_params, x=x),
+            'residual': residual}
+
+
+def global_fit(model, datasets, shared, params=None, max_nfev=None,
+               iter_cb=None):
+    '''
+    Fit a model to several data sets at once.
+
+    Parameters
+    ----------
+    model : ModelContainer
+        Model to fit, its current parameters are used as start values
+        unless *params* is given.
+    datasets : list(tuple)
+        (x, y, weights) of every data set.
+    shared : list(str)
+        Names of the parameters which are the same for all data sets.
+    max_nfev : int
+        Maximum number of evaluations of all residuals.
+    iter_cb : function
+        Called as iter_cb(None, n, None) before the n-th evaluation, the
+        fit is cancelled if it returns True. This way the global fit can
+        be run by a FitWorker.
+
+    Returns
+    -------
+    results : list(ResultContainer)
+        One result per data set, None if the fit was cancelled. The
+        shared parameters have the same values in all results.
+    '''
+    if params is None:
+        params = model.get_parameters()
+
+    params = copy.deepcopy(params)
+    datasets = [(np.asarray(x, dtype=float), np.asarray(y, dtype=float),
+                 np.ones(len(y)) if w is None else np.asarray(w, dtype=float))
+                for x, y, w in datasets]
+
+    problem = GlobalProblem(model.model, datasets, shared, params)
+    p0, bounds = problem.start_values()
+    evaluations = [0]
+
+    def residuals(p):
+        evaluations[0] += 1
+
+        if iter_cb is not None and iter_cb(None, evaluations[0], None):
+            raise _Abort()
+
+        return np.concatenate([problem.residual(p, i)
+                               for i in range(len(datasets))])
+
+    try:
+        opt = least_squares(residuals, p0, jac='2-point',
+                            jac_sparsity=problem.sparsity(), bounds=bounds,
+                            method='trf', tr_solver='lsmr', x_scale='jac',
+                            max_nfev=max_nfev)
+    except _Abort:
+        return [None] * len(datasets)
+
+    ndata = problem.offsets[-1]
+    nfree = max(ndata - len(p0), 1)
+    scale = 2. * opt.cost / nfree
+    covariances = problem.covariance(opt.jac, scale)
+    results = []
+
+    for i, (x, y, w) in enumerate(datasets):
+        residual = opt.fun[problem.offsets[i]:problem.offsets[i + 1]]
+        problem.set_values(opt.x, i)
+        covar = None if covariances is None else covariances[i]
+        state = _result_state(problem, i, residual, params, covar, opt)
+        result = rebuild_result(model.model, problem.dataset_params[i], state,
+                                init_params=params, data=y, weights=w, x=x)
+        results.append(ResultContainer(result))
+
+    return results
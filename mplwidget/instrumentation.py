@@ -0,0 +1,177 @@
+'''
+Frame time instrumentation for MatplotlibWidget.
+
+Enable it with MatplotlibWidget.enable_instrumentation. The helpers in
+this module are called by the navigation toolbar and do nothing if the
+canvas is not instrumented, so they cost an attribute lookup when the
+instrumentation is disabled.
+'''
+
+from timeit import default_timer as clock
+
+import numpy as np
+from matplotlib.backends.qt_compat import QtCore, QtGui
+
+# needed for compatibility with PyQt5
+try:
+    from matplotlib.backends.qt_compat import QtWidgets
+except ImportError:
+    QtWidgets = QtGui
+
+from .stream import RingBuffer
+
+
+FRAME_DTYPE = np.dtype([('time', float),
+                        ('duration', float),
+                        ('latency', float),
+                        ('artists', int),
+                        ('kind', 'U8'),
+                        ('trigger', 'U16')])
+
+
+def count_artists(figure):
+    '''Number of artists drawn with *figure*, not counting tick labels'''
+    return sum(len(axes.get_children()) for axes in figure.axes)
+
+
+class FrameStats(object):
+    '''
+    Bounded record of the latest *capacity* frames.
+
+    A frame is either a full draw of the canvas or a blit of a part of it.
+    For every frame the wall time it took, the number of artists, the
+    event which triggered it and, if it was triggered by user input, the
+    time from the input event to the rendered frame are kept.
+    '''
+    def __init__(self, capacity=1000):
+        self.frames = RingBuffer(capacity, dtype=FRAME_DTYPE)
+        self._trigger = None
+        self._inputTime = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def mark_input(self, trigger):
+        '''Note a user input, the next frame is attributed to it'''
+        if self._inputTime is None:
+            self._inputTime = clock()
+
+        self._trigger = trigger
+
+    def mark_request(self, trigger='request'):
+        '''Note the reason for the next frame unless an input is pending'''
+        if self._trigger is None:
+            self._trigger = trigger
+
+    def record(self, start, artists, kind='draw'):
+        '''Record a frame which started at *start* (a clock value)'''
+        end = clock()
+
+        if self._inputTime is None:
+            latency = np.nan
+        else:
+            latency = end - self._inputTime
+
+        frame = np.array([(end, end - start, latency, artists, kind,
+                           self._trigger or 'direct')], dtype=FRAME_DTYPE)
+        self.frames.extend(frame)
+
+        self._trigger = None
+        self._inputTime = None
+
+    def get_frames(self, kind=None, trigger=None):
+        '''Get the recorded frames as a structured array, oldest first'''
+        frames = self.frames.view
+
+        if kind is not None:
+            frames = frames[frames['kind'] == kind]
+
+        if trigger is not None:
+            frames = frames[frames['trigger'] == trigger]
+
+        return frames
+
+    def percentiles(self, field='duration', q=(50, 90, 99), kind=None,
+                    trigger=None):
+        '''
+        Get percentiles of *field* ('duration' or 'latency') in ms.
+
+        Returns a dict mapping each percentile to its value, values are nan
+        if there are no frames.
+        '''
+        values = self.get_frames(kind, trigger)[field]
+        values = values[np.isfinite(values)] * 1e3
+
+        if len(values) == 0:
+            return dict((p, np.nan) for p in q)
+
+        return dict(zip(q, np.percentile(values, q).tolist()))
+
+    def fps(self, window=1.):
+        '''Frames rendered within the last *window* seconds per second'''
+        times = self.frames.view['time']
+
+        if len(times) == 0:
+            return 0.
+
+        return np.count_nonzero(times > clock() - window) / window
+
+    def last_duration(self):
+        '''Wall time of the latest frame in ms'''
+        if len(self.frames) == 0:
+            return np.nan
+
+        return self.frames.view['duration'][-1] * 1e3
+
+    def clear(self):
+        self.frames.clear()
+        self._trigger = None
+        self._inputTime = None
+
+
+class StatsOverlay(QtWidgets.QLabel):
+    '''Show the frame rate and the latest frame time on top of a canvas'''
+    def __init__(self, stats, parent, interval=250):
+        super(StatsOverlay, self).__init__(parent)
+
+        self.stats = stats
+        self.setStyleSheet('background-color: rgba(0, 0, 0, 128);'
+                           'color: white; padding: 2px;')
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+        self.move(4, 4)
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start(interval)
+
+        self.refresh()
+        self.show()
+
+    def refresh(self):
+        self.setText('{0:.0f} fps | {1:.1f} ms'.format(
+            self.stats.fps(), self.stats.last_duration()))
+        self.adjustSize()
+
+
+def mark_input(canvas, trigger):
+    '''Attribute the next frame of *canvas* to the user input *trigger*'''
+    stats = getattr(canvas, 'frame_stats', None)
+
+    if stats is not None:
+        stats.mark_input(trigger)
+
+
+def start_frame(canvas):
+    '''Get the start time for record_frame, None if not instrumented'''
+    if getattr(canvas, 'frame_stats', None) is None:
+        return None
+
+    return clock()
+
+
+def record_frame(canvas, start, artists, kind='blit'):
+    '''Record a frame of *canvas* which was started with start_frame'''
+    if start is None:
+        return
+
+    canvas.frame_stats.record(start, artists, kind=kind)
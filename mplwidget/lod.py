@@ -0,0 +1,234 @@
+'''
+Level of detail (LOD) handling for lines with a large number of points.
+
+Only about two points per pixel column can be seen on screen, so instead of
+the full data a min/max decimated version matching the current view is
+handed to matplotlib. Taking the minimum and the maximum of every bin keeps
+narrow peaks visible.
+'''
+
+import numpy as np
+
+
+class GrowingArray(object):
+    '''
+    1D array with amortised O(1) appends.
+
+    Memory is reserved in chunks of growing size, *view* returns the
+    filled part without copying.
+    '''
+    def __init__(self, dtype=float, capacity=0):
+        self._data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def view(self):
+        return self._data[:self.size]
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype).ravel()
+        size = self.size + len(values)
+
+        if size > len(self._data):
+            data = np.empty(max(size, 2 * len(self._data)),
+                            dtype=self._data.dtype)
+            data[:self.size] = self.view
+            self._data = data
+
+        self._data[self.size:size] = values
+        self.size = size
+
+
+class MinMaxPyramid(object):
+    '''
+    Min/max decimation pyramid of a data set with sorted x values.
+
+    Level k combines factor ** (k + 1) consecutive samples into one bin and
+    stores the indices of the smallest and the largest y value of each bin.
+    Only complete bins are stored, coarser levels are added as long as they
+    contain at least *min_bins* bins.
+
+    Parameters
+    ----------
+    x, y : array_like
+        Data, x has to be monotonically increasing.
+    factor : int
+        Number of bins of one level combined into a bin of the next level.
+    min_bins : int
+        Minimum number of bins of the coarsest level.
+    '''
+    def __init__(self, x, y, factor=4, min_bins=256):
+        self.factor = factor
+        self.min_bins = min_bins
+
+        self._x = GrowingArray()
+        self._y = GrowingArray()
+        self._imin = []
+        self._imax = []
+
+        self.append(x, y)
+
+    def __len__(self):
+        return len(self._x)
+
+    @property
+    def x(self):
+        return self._x.view
+
+    @property
+    def y(self):
+        return self._y.view
+
+    def bin_size(self, level):
+        return self.factor ** (level + 1)
+
+    def append(self, x, y):
+        '''
+        Append data points and update the affected bins of all levels.
+        '''
+        x = np.asarray(x, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+
+        if len(x) != len(y):
+            raise ValueError('x and y must have the same length')
+
+        if len(self) > 0 and len(x) > 0 and x[0] < self.x[-1]:
+            raise ValueError('x values have to be increasing')
+
+        self._x.extend(x)
+        self._y.extend(y)
+        self._update()
+
+    def _update(self):
+        y = self.y
+        f = self.factor
+        level = 0
+
+        while len(self) // self.bin_size(level) >= self.min_bins:
+            if level == len(self._imin):
+                self._imin.append(GrowingArray(dtype=np.intp))
+                self._imax.append(GrowingArray(dtype=np.intp))
+
+            imin, imax = self._imin[level], self._imax[level]
+            start = len(imin)
+            stop = len(self) // self.bin_size(level)
+
+            if stop > start:
+                if level == 0:
+                    offset = np.arange(start, stop) * f
+                    block = y[start * f:stop * f].reshape(-1, f)
+                    new_min = offset + np.argmin(block, axis=1)
+                    new_max = offset + np.argmax(block, axis=1)
+                else:
+                    rows = np.arange(stop - start)
+                    children = slice(start * f, stop * f)
+
+                    cand = self._imin[level - 1].view[children].reshape(-1, f)
+                    new_min = cand[rows, np.argmin(y[cand], axis=1)]
+
+                    cand = self._imax[level - 1].view[children].reshape(-1, f)
+                    new_max = cand[rows, np.argmax(y[cand], axis=1)]
+
+                imin.extend(new_min)
+                imax.extend(new_max)
+
+            level += 1
+
+    def decimate(self, xmin, xmax, width):
+        '''
+        Get the data to show for an x range *xmin* ... *xmax* which is
+        *width* pixels wide.
+
+        Returns
+        -------
+        x, y : numpy.ndarray
+            At least *width* min/max pairs if the range contains enough
+            points, otherwise the full resolution data of the range. One
+            point outside of the range is kept on both sides, so the line
+            continues to the edges of the axes.
+        '''
+        x, y = self.x, self.y
+
+        i0 = max(np.searchsorted(x, xmin, side='left') - 1, 0)
+        i1 = min(np.searchsorted(x, xmax, side='right') + 1, len(self))
+        n = i1 - i0
+
+        # coarsest level which still has at least *width* bins in range
+        level = -1
+
+        while (level + 1 < len(self._imin) and
+               n // self.bin_size(level + 1) >= width):
+            level += 1
+
+        if level < 0:
+            return x[i0:i1], y[i0:i1]
+
+        size = self.bin_size(level)
+        b0 = i0 // size
+        b1 = min(i1 // size, len(self._imin[level]))
+
+        imin = self._imin[level].view[b0:b1]
+        imax = self._imax[level].view[b0:b1]
+
+        # keep the order of min and max within each bin
+        idx = np.empty(2 * len(imin), dtype=np.intp)
+        idx[0::2] = np.minimum(imin, imax)
+        idx[1::2] = np.maximum(imin, imax)
+
+        # points behind the last complete bin are not in the pyramid
+        tail = np.arange(max(b1 * size, i0), i1)
+        idx = np.concatenate([idx, tail])
+
+        return x[idx], y[idx]
+
+
+class LODLine(object):
+    '''
+    Show a decimated version of a Line2D matching the current view.
+
+    The full resolution data is kept in a MinMaxPyramid and can be
+    retrieved with *get_data*. The data of the line is replaced every
+    time the x limits of the axes or the size of the canvas change.
+    '''
+    def __init__(self, line, factor=4, min_bins=256):
+        x, y = line.get_data()
+        x = np.asarray(x, dtype=float)
+
+        if np.any(np.diff(x) < 0):
+            raise ValueError('level of detail needs increasing x values')
+
+        self.line = line
+        self.axes = line.axes
+        self.pyramid = MinMaxPyramid(x, y, factor=factor, min_bins=min_bins)
+
+        self._cidLim = self.axes.callbacks.connect('xlim_changed',
+                                                   self.update)
+        self._cidResize = self.axes.figure.canvas.mpl_connect('resize_event',
+                                                              self.update)
+
+        # make the full data available to others, e.g. for fitting
+        line.lod = self
+
+        self.update()
+
+    def get_data(self):
+        return self.pyramid.x, self.pyramid.y
+
+    def append(self, x, y):
+        self.pyramid.append(x, y)
+        self.update()
+
+    def update(self, *args):
+        xmin, xmax = sorted(self.axes.get_xlim())
+        width = max(int(self.axes.bbox.width), 1)
+        self.line.set_data(*self.pyramid.decimate(xmin, xmax, width))
+
+    def remove(self):
+        '''Disconnect from the axes and restore the full data'''
+        self.axes.callbacks.disconnect(self._cidLim)
+        self.axes.figure.canvas.mpl_disconnect(self._cidResize)
+        self.line.set_data(*self.get_data())
+        del self.line.lod
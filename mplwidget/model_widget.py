@@ -15,6 +15,7 @@ except ImportError:
 import inspect
 import lmfit
 from .models import model_dict
+from .models.jacobian import add_jacobian, get_derivatives
 
 
 MODELS = {name: obj for name, obj in lmfit.models.__dict__.items()
@@ -76,144 +77,251 @@ def generate_prefix(model, used_prefixes=[]):
         i += 1
 
 
-def add_models(model1, model2):
+def dump_description(description):
     '''
-    Add model2 to model1.
+    Convert a model description to plain lists of model name, prefix and
+    arguments, e.g. for JSON. Only models in MODELS can be described.
+    '''
+    data = []
 
-    Model1 may be a composite model, model2 must not be a composite model.
+    for cls, prefix, args in description:
+        if MODELS.get(cls.__name__) is not cls:
+            raise ValueError('unknown model {0}'.format(cls.__name__))
 
-    Parameters
-    ----------
-    model1 : lmfit.Model
-        lmfit fit model (may be composite)
-    model2 : lmfit.Model
-        lmfit fit model (must not be composite!)
+        data.append([cls.__name__, prefix, list(args)])
 
-    Returns
-    -------
-    model : lmfit.Model
-        A composite lmfit fit model.
+    return data
+
+
+def load_description(data):
     '''
-    if model1 is None:
-        return model2
-
-    # get list of already used prefixes, needed to create new prefixes
-    prefixes = [comp.prefix for comp in model1.components]
-
-    # extract root parameter names of model2 to check for duplicate names
-    mod2_params = set(model2._param_root_names)
-
-    # check if the root parameter names of model2 already occur in the
-    # components of model1
-    for comp in model1.components:
-        if not mod2_params.isdisjoint(comp._param_root_names):
-            # at least one of the parameter names exists in both models
-            # create a new prefix for model2 and add it to the list of
-            # already used prefixes
-            prefix = generate_prefix(model2, prefixes)
-            prefixes += [prefix]
-
-            # since somehow the prefix of an existing model cannot be changed,
-            # recreate a model of the same class with the new prefix
-            model2 = model2.__class__(prefix=prefix)
-
-            # no need to check additional components since we already now there
-            # is a duplicate and the prefix is added to model2
-            break
-
-    # the goal is that all models with duplicate parameter names have a prefix
-    # so we still need to check if all components of model1 with duplicate
-    # parameter names already have a prefix and add one if this is not the case
-    for comp in model1.components:
-        # check if there are duplicate parameter names
-        if not mod2_params.isdisjoint(comp._param_root_names):
-            if comp.prefix == '':
-                # the component does not have a prefix yet, so add one
-                prefix = generate_prefix(comp, prefixes)
-                prefixes += [prefix]
-                comp = comp.__class__(prefix=prefix)
+    Convert the output of dump_description back to a model description.
 
-        model2 += comp
+    Model names are looked up in MODELS, so nothing but the known models
+    can be created from the data. Raises ValueError for unknown models.
+    '''
+    description = []
 
-    return model2
+    for name, prefix, args in data:
+        # 'module:Class' as written by older versions
+        name = name.rpartition(':')[2]
 
+        try:
+            cls = MODELS[name]
+        except KeyError:
+            raise ValueError('unknown model {0}'.format(name))
 
-def remove_component(model, component):
-    '''
-    Remove component from a composite lmfit model.
+        description.append((cls, prefix, tuple(args)))
 
-    Works by recreating the model by adding the individual
-    components back together and omitting the component we
-    want to remove.
+    return description
 
-    Parameters
-    ----------
-    model : lmfit.Model
-        A (composite) lmfit fit model.
-    component : lmfit.Model
-        lmfit model component to remove.
 
-    Returns
-    -------
-    model : lmfit.Model
-        The original fit model without the component.
+def build_model(description):
     '''
-    if component not in model.components:
-        return model
-
-    component_list = model.components[:]
-    component_list.remove(component)
+    Create the sum of the components in a description from
+    ModelContainer.describe.
+    '''
+    model = None
 
-    new_model = None
+    for cls, prefix, args in description:
+        comp = cls(*args, prefix=prefix)
 
-    for comp in component_list:
-        new_model = add_models(new_model, comp)
+        if model is None:
+            model = comp
+        else:
+            model += comp
 
-    return new_model
+    return model
 
 
 class ModelContainer(object):
+    '''
+    A fit model, its start parameters and its fit results.
+
+    The components of the model are kept in a flat list together with the
+    arguments needed to create them. Prefixes are assigned once when a
+    component is added and do not change afterwards. The composite lmfit
+    model, its parameters and its derivatives are only built when they are
+    needed after the list of components has changed.
+    '''
     def __init__(self, name='', model=None, parameters=None, results=None):
         self.name = name
-        self.model = model
+
+        self._components = []
+        self._args = []
+        self._version = 0
+        self._model = None
+        self._derivatives = None
+        self._derivativesVersion = None
+
+        if model is not None:
+            self.model = model
+
         self.parameters = parameters
 
+        # parameters handed in belong to the model handed in
+        self._parametersVersion = self._version if parameters else None
+
         if results is None:
             results = {}
 
         self.results = results
 
-    def add_component(self, component):
-        self.model = add_models(self.model, component)
+    @classmethod
+    def from_description(cls, name, description, parameters=None):
+        '''
+        Create a container from a description as returned by describe.
+
+        The prefixes in the description are kept as they are.
+        '''
+        container = cls(name=name)
+
+        for comp_cls, prefix, args in description:
+            container._components.append(comp_cls(*args, prefix=prefix))
+            container._args.append(tuple(args))
+
+        container._changed()
+
+        if parameters is not None:
+            container.parameters = parameters
+            container._parametersVersion = container._version
+
+        return container
+
+    @property
+    def model(self):
+        if self._model is None and self._components:
+            model = self._components[0]
+
+            for comp in self._components[1:]:
+                model = model + comp
+
+            self._model = model
+
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        if model is None:
+            components = []
+        else:
+            components = list(model.components)
+
+        self._components = components
+        self._args = [()] * len(components)
+        self._changed()
+
+    def _changed(self):
+        self._version += 1
+        self._model = None
+
+    def add_component(self, component, args=()):
+        '''
+        Add a component to the model.
+
+        If parameter names clash with an existing component, the new
+        component and, if it has none yet, the existing one get a prefix.
+        *args* are the arguments the component has been created with, they
+        are needed to create it again with a different prefix.
+        '''
+        prefixes = [comp.prefix for comp in self._components]
+        new_params = set(component._param_root_names)
+        clash = False
+
+        for i, comp in enumerate(self._components):
+            if new_params.isdisjoint(comp._param_root_names):
+                continue
+
+            clash = True
+
+            if comp.prefix == '':
+                # a prefix cannot be changed, so the component is created
+                # again, this only happens once per component
+                prefix = generate_prefix(comp, prefixes)
+                prefixes.append(prefix)
+                self._components[i] = comp.__class__(*self._args[i],
+                                                     prefix=prefix)
+
+        if clash:
+            prefix = generate_prefix(component, prefixes)
+            component = component.__class__(*args, prefix=prefix)
+
+        self._components.append(component)
+        self._args.append(tuple(args))
+        self._changed()
 
     def remove_component(self, idx):
-        selected_component = self.model.components[idx]
-        self.model = remove_component(self.model, selected_component)
+        self._components.pop(idx)
+        self._args.pop(idx)
+        self._changed()
 
     def set_name(self, name):
         self.name = str(name)
 
     def get_components(self):
-        return self.model.components
+        return list(self._components)
+
+    def describe(self):
+        '''
+        Describe the model by class, prefix and arguments of its components.
+
+        The model can be created again from the description with
+        build_model.
+        '''
+        return [(comp.__class__, comp.prefix, args)
+                for comp, args in zip(self._components, self._args)]
 
     def get_parameters(self):
-        if self.parameters is None:
-            self.parameters = self.model.make_params()
+        if self._parametersVersion != self._version:
+            parameters = self.model.make_params()
+
+            # keep the values of parameters which are still there
+            if self.parameters is not None:
+                for name, par in parameters.items():
+                    if name in self.parameters and par.expr is None:
+                        old = self.parameters[name]
+                        par.set(value=old.value, min=old.min, max=old.max,
+                                vary=old.vary)
 
-        if set(self.parameters.keys()) != set(self.model.make_params().keys()):
-            self.parameters = self.model.make_params()
+            self.parameters = parameters
+            self._parametersVersion = self._version
 
         return self.parameters
 
     def set_parameters(self, parameters):
         self.parameters = parameters
 
+    def get_derivatives(self):
+        if self._derivativesVersion != self._version:
+            self._derivatives = get_derivatives(self.model)
+            self._derivativesVersion = self._version
+
+        return self._derivatives
+
     def fit(self, *args, **kwargs):
+        """
+        Fit the model, see lmfit.Model.fit.
+
+        An analytic Jacobian is used if the derivatives of all components
+        are known.
+        """
+        derivatives = self.get_derivatives()
+
+        if derivatives is not None:
+            kwargs = add_jacobian(self.model, kwargs, derivatives)
+
         return self.model.fit(*args, **kwargs)
 
     def update_parameters(self, value_dict):
-        for par in self.parameters.values():
-            v = value_dict[par.name]
+        '''Apply the values in *value_dict*, other parameters are kept'''
+        parameters = self.get_parameters()
+
+        for name, v in value_dict.items():
+            try:
+                par = parameters[name]
+            except KeyError:
+                continue
+
             par.value = v['value']
             par.min = v['lower']
             par.max = v['upper']
@@ -332,7 +440,7 @@ class ModelWidget(QtWidgets.QDialog):
                 args.append(text)
 
         try:
-            self.model.add_component(selected_model(*args))
+            self.model.add_component(selected_model(*args), args=args)
             self.update_component_list()
         except Exception as exc:
             message = '<b>{0}</b><br><br>{1}'.format(type(exc).__name__,
@@ -0,0 +1,299 @@
+'''
+Analytic Jacobians for fits with lmfit's leastsq.
+
+The Jacobian handed to leastsq (Dfun) is the derivative of the residual
+with respect to the varying parameters. It is assembled from the
+derivatives of the model function with respect to its parameters. For
+composite models the derivatives of the components are combined, which
+works for sums of components whose derivatives are registered with
+register_derivatives.
+'''
+
+import operator
+
+import numpy as np
+from scipy.special import wofz
+from lmfit import models
+from lmfit.model import CompositeModel
+
+
+s2 = np.sqrt(2.)
+s2pi = np.sqrt(2. * np.pi)
+
+DERIVATIVES = {}
+
+
+def register_derivatives(model_class, derivatives):
+    '''
+    Register the derivatives of the function of a model class.
+
+    *derivatives* is called as derivatives(x, **values), where values
+    contains the parameter values without prefix, and has to return a dict
+    with the derivative for every parameter name (again without prefix).
+    '''
+    DERIVATIVES[model_class] = derivatives
+
+
+def gaussian_derivatives(x, amplitude, center, sigma):
+    arg = (x - center) / sigma
+    g = np.exp(-arg ** 2 / 2.) / (s2pi * sigma)
+
+    return {'amplitude': g,
+            'center': amplitude * g * arg / sigma,
+            'sigma': amplitude * g * (arg ** 2 - 1.) / sigma}
+
+
+def lorentzian_derivatives(x, amplitude, center, sigma):
+    dx = x - center
+    denom = sigma ** 2 + dx ** 2
+    lorentz = sigma / (np.pi * denom)
+
+    return {'amplitude': lorentz,
+            'center': amplitude * lorentz * 2. * dx / denom,
+            'sigma': amplitude * (dx ** 2 - sigma ** 2) / (np.pi * denom ** 2)}
+
+
+def voigt_derivatives(x, amplitude, center, sigma, gamma=None):
+    tied = gamma is None
+
+    if tied:
+        # the function uses gamma = sigma
+        gamma = sigma
+
+    z = (x - center + 1j * gamma) / (sigma * s2)
+    w = wofz(z)
+    # derivative of the Faddeeva function
+    dw = -2. * z * w + 2j / np.sqrt(np.pi)
+    norm = 1. / (sigma * s2pi)
+    voigt = norm * w.real
+
+    result = {'amplitude': voigt,
+              'center': amplitude * norm * (-dw / (sigma * s2)).real,
+              'gamma': amplitude * norm * (1j * dw / (sigma * s2)).real,
+              'sigma': amplitude * (-voigt / sigma +
+                                    norm * (-dw * z / sigma).real)}
+
+    if tied:
+        result['sigma'] += result.pop('gamma')
+
+    return result
+
+
+def exponential_derivatives(x, amplitude, decay):
+    e = np.exp(-x / decay)
+
+    return {'amplitude': e,
+            'decay': amplitude * e * x / decay ** 2}
+
+
+def linear_derivatives(x, slope, intercept):
+    return {'slope': np.asarray(x, dtype=float),
+            'intercept': np.ones(np.shape(x))}
+
+
+register_derivatives(models.GaussianModel, gaussian_derivatives)
+register_derivatives(models.LorentzianModel, lorentzian_derivatives)
+register_derivatives(models.VoigtModel, voigt_derivatives)
+register_derivatives(models.ExponentialModel, exponential_derivatives)
+register_derivatives(models.LinearModel, linear_derivatives)
+
+
+def additive_components(model):
+    '''
+    Get the components of a model which is a sum of components.
+
+    Returns None if the model contains other operations.
+    '''
+    if not isinstance(model, CompositeModel):
+        return [model]
+
+    if model.op is not operator.add:
+        return None
+
+    left = additive_components(model.left)
+    right = additive_components(model.right)
+
+    if left is None or right is None:
+        return None
+
+    return left + right
+
+
+def get_derivatives(model):
+    '''
+    Get a function computing the derivatives of *model* with respect to
+    its parameters, see make_dfun.
+
+    Returns None if the derivatives of a component are unknown.
+    '''
+    components = additive_components(model)
+
+    if components is None:
+        return None
+
+    for comp in components:
+        if (type(comp) not in DERIVATIVES or
+                list(comp.independent_vars) != ['x']):
+            return None
+
+    def derivatives(params, x=None, **kwargs):
+        result = {}
+
+        for comp in components:
+            # the parameter values exactly as they are passed to the
+            # model function
+            values = comp.make_funcargs(params)
+            values.pop('x', None)
+
+            for name, d in DERIVATIVES[type(comp)](x, **values).items():
+                name = comp.prefix + name
+
+                if name in result:
+                    result[name] = result[name] + d
+                else:
+                    result[name] = d
+
+        return result
+
+    return derivatives
+
+
+def _alias(par):
+    '''Name of the parameter *par* is tied to by its expression, or None'''
+    if par.expr is None:
+        return None
+
+    expr = par.expr.strip()
+
+    if expr.replace('_', 'a').isalnum():
+        return expr
+
+    return None
+
+
+def can_use_jacobian(params, names):
+    '''
+    Check if the derivatives with respect to the parameters *names* are
+    sufficient to compute the Jacobian.
+
+    This is the case if none of these parameters is constrained by an
+    expression other than a plain reference to another parameter.
+    '''
+    for name in names:
+        par = params[name]
+
+        if par.expr is not None and _alias(par) not in params:
+            return False
+
+    return True
+
+
+def _residual_sign(model, params, data, weights, kwargs):
+    '''
+    Get the sign of the model in the residual of *model*, depending on the
+    lmfit version it is either (model - data) or (data - model).
+    '''
+    residual = model._residual(params, data, weights, **kwargs)
+    diff = model.eval(params, **kwargs) - data
+
+    if weights is not None:
+        diff = diff * weights
+
+    diff = np.ravel(diff)
+
+    if np.dot(residual, diff) < 0:
+        return -1.
+
+    return 1.
+
+
+def make_dfun(model, derivatives):
+    '''
+    Create a Jacobian function for leastsq.
+
+    Parameters
+    ----------
+    model : lmfit.Model
+        The model to fit.
+    derivatives : function
+        derivatives(params, **kwargs) has to return a dict with the
+        derivatives of the model with respect to its parameters for the
+        independent variables in kwargs.
+
+    Returns
+    -------
+    dfun : function
+        To be passed in fit_kws as Dfun together with col_deriv=True.
+    '''
+    sign = []
+
+    def dfun(params, data, weights, **kwargs):
+        if not sign:
+            sign.append(_residual_sign(model, params, data, weights, kwargs))
+
+        derivs = derivatives(params, **kwargs)
+
+        # resolve parameters tied to other parameters by their expression
+        for name in list(derivs.keys()):
+            alias = _alias(params[name])
+
+            if alias is not None:
+                d = derivs.pop(name)
+
+                if alias in derivs:
+                    derivs[alias] = derivs[alias] + d
+                else:
+                    derivs[alias] = d
+
+        var_names = [name for name, par in params.items()
+                     if par.vary and par.expr is None]
+
+        jac = np.zeros((len(var_names), np.size(data)))
+
+        for i, name in enumerate(var_names):
+            try:
+                jac[i] = derivs[name]
+            except KeyError:
+                # the model does not depend on this parameter
+                pass
+
+        if weights is not None:
+            jac *= np.ravel(weights)
+
+        return sign[0] * jac
+
+    return dfun
+
+
+def add_jacobian(model, kwargs, derivatives=None):
+    '''
+    Add an analytic Jacobian to the keyword arguments of Model.fit.
+
+    The derivatives are looked up with get_derivatives if not given.
+    Nothing is added if the fit method is not leastsq, if the derivatives
+    are unknown or if the parameters cannot be handled (see
+    can_use_jacobian), so the fit falls back to finite differences.
+    '''
+    params = kwargs.get('params')
+
+    if derivatives is None:
+        derivatives = get_derivatives(model)
+
+    if derivatives is None:
+        return kwargs
+
+    if params is None or kwargs.get('method', 'leastsq') != 'leastsq':
+        return kwargs
+
+    if not can_use_jacobian(params, model.param_names):
+        return kwargs
+
+    fit_kws = dict(kwargs.get('fit_kws') or {})
+
+    if 'Dfun' not in fit_kws:
+        fit_kws['Dfun'] = make_dfun(model, derivatives)
+        fit_kws['col_deriv'] = True
+
+    kwargs['fit_kws'] = fit_kws
+
+    return kwargs
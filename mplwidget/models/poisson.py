@@ -1,22 +1,71 @@
+import threading
+
 import numpy as np
-import scipy.misc
+from scipy.special import gammaln, xlogy
 from lmfit.model import Model
-from lmfit.models import update_param_vals, index_of
+from lmfit.models import update_param_vals
+
+from .jacobian import add_jacobian, register_derivatives
 
 
 __author__ = 'uffinger'
 
 
+# number of x arrays the log factorials are cached for in every thread
+CACHE_SIZE = 8
+
+# fits run in several threads at once, each has its own cache
+_log_factorials = threading.local()
+
+
+def log_factorial(x):
+    '''
+    log(x!) evaluated with gammaln.
+
+    The result is cached for the last few x arrays, so repeated evaluations
+    during a fit compute it only once. Cached values are found by the
+    contents of x, comparing them is much cheaper than gammaln.
+    '''
+    x = np.asarray(x, dtype=float)
+    entries = getattr(_log_factorials, 'entries', None)
+
+    if entries is None:
+        entries = _log_factorials.entries = []
+
+    for cached_x, value in entries:
+        if cached_x.shape == x.shape and np.array_equal(cached_x, x):
+            return value
+
+    value = gammaln(x + 1)
+    value.setflags(write=False)
+
+    entries.insert(0, (x.copy(), value))
+    del entries[CACHE_SIZE:]
+
+    return value
+
+
+def poisson(x, amp, mu):
+    # evaluated in log space, mu ** x and x! overflow for large x
+    return amp * np.exp(xlogy(x, mu) - mu - log_factorial(x))
+
+
+def poisson_derivatives(x, amp, mu):
+    f = poisson(x, 1., mu)
+
+    return {'amp': f, 'mu': amp * f * (x / mu - 1.)}
+
+
 def guess_from_peak(model, y, x):
     "estimate amp, cen, sigma for a peak, create params"
 
     if x is None:
         return 1.0, 0.0, 1.0
 
-    maxy, miny = max(y), min(y)
-    imaxy = index_of(y, maxy)
+    y = np.asarray(y)
+    imaxy = np.argmax(y)
     mu = x[imaxy]
-    amp = (maxy - miny) * 2.0
+    amp = (y[imaxy] - np.min(y)) * 2.0
 
     pars = model.make_params(mu=mu, amp=amp)
 
@@ -41,14 +90,29 @@ prefix: string to prepend to paramter names, needed to add two Models that
 
 
 class PoissonModel(Model):
-    __doc__ = "x -> amp * exp(-mu) * mu ** x / scipy.misc.factorial(x)" + COMMON_DOC
+    __doc__ = "x -> amp * exp(-mu) * mu ** x / x!" + COMMON_DOC
 
     def __init__(self, *args, **kwargs):
-        def poisson(x, amp, mu):
-            return amp * np.exp(-mu) * mu ** x / scipy.misc.factorial(x)
-
         super(PoissonModel, self).__init__(poisson, *args, **kwargs)
+        self.set_param_hint('mu', min=0)
 
     def guess(self, data, x=None, **kwargs):
         pars = guess_from_peak(self, data, x)
         return update_param_vals(pars, self.prefix, **kwargs)
+
+    def fit(self, data, params=None, weights=None, jacobian=False, **kwargs):
+        '''
+        Fit the model to the data, see lmfit.Model.fit.
+
+        If *jacobian* is True the analytic Jacobian is used with leastsq
+        instead of finite differences.
+        '''
+        kwargs['params'] = params
+
+        if jacobian:
+            kwargs = add_jacobian(self, kwargs)
+
+        return super(PoissonModel, self).fit(data, weights=weights, **kwargs)
+
+
+register_derivatives(PoissonModel, poisson_derivatives)
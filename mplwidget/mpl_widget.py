@@ -16,6 +16,8 @@ Derived from 'embedding_in_pyqt4.py':
 Copyright © 2005 Florent Rougon, 2006 Darren Dale
 """
 
+import time
+from timeit import default_timer as clock
 
 from matplotlib.backends.qt_compat import QtCore, QtGui
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as Canvas
@@ -28,7 +30,10 @@ try:
 except ImportError:
     QtWidgets = QtGui
 
+from .instrumentation import FrameStats, StatsOverlay, count_artists
 from .navtoolbar import NavigationToolbar
+from .lod import LODLine
+from .stream import StreamLine
 
 __version__ = "1.0.0"
 
@@ -84,6 +89,9 @@ class MatplotlibWidget(Canvas):
     height (3): height in inches
     dpi (100): resolution in dpi
     hold (False): if False, figure will be cleared each time plot is called
+    fps (60): maximum rate of redraws scheduled with request_redraw
+    autoscale_interval (0.25): minimum time in seconds between two
+        autoscales caused by streamed data
 
     Widget attributes:
     -----------------
@@ -97,12 +105,25 @@ class MatplotlibWidget(Canvas):
     x = linspace(-10, 10)
     self.widget.axes.plot(x, x**2)
     self.wdiget.axes.plot(x, x**3)
+    self.widget.request_redraw()
     """
     canvasUpdated = QtCore.Signal()
 
     def __init__(self, parent=None, title='', xlabel='', ylabel='',
                  xlim=None, ylim=None, xscale='linear', yscale='linear',
-                 width=4, height=3, dpi=100, hold=False):
+                 width=4, height=3, dpi=100, hold=False, fps=60,
+                 autoscale_interval=0.25):
+        self._redrawTimer = None
+        self._lastDraw = 0.
+        self.frame_interval = 1000. / fps
+        self._lodLines = {}
+        self._streams = {}
+        self._autoscaleAxes = set()
+        self._lastAutoscale = 0.
+        self.autoscale_interval = autoscale_interval
+        self.frame_stats = None
+        self._statsOverlay = None
+
         self.figure = Figure(figsize=(width, height), dpi=dpi)
         self.axes = self.figure.add_subplot(111)
         self.axes.set_title(title)
@@ -125,6 +146,15 @@ class MatplotlibWidget(Canvas):
                              QtWidgets.QSizePolicy.Expanding)
         Canvas.updateGeometry(self)
 
+        self._redrawTimer = QtCore.QTimer(self)
+        self._redrawTimer.setSingleShot(True)
+        self._redrawTimer.timeout.connect(self.draw)
+
+        # redraw once the autoscale interval of the streams has passed
+        self._autoscaleTimer = QtCore.QTimer(self)
+        self._autoscaleTimer.setSingleShot(True)
+        self._autoscaleTimer.timeout.connect(self.request_redraw)
+
         self.toolbar = NavigationToolbar(self, self)
 
     def sizeHint(self):
@@ -134,9 +164,153 @@ class MatplotlibWidget(Canvas):
     def minimumSizeHint(self):
         return QtCore.QSize(10, 10)
 
+    def request_redraw(self):
+        """
+        Schedule a redraw of the canvas.
+
+        All requests made until the next frame (see *fps*) are merged into
+        a single render on the Qt event loop.
+        """
+        if self._redrawTimer is None:
+            self.draw()
+            return
+
+        if self._redrawTimer.isActive():
+            return
+
+        if self.frame_stats is not None:
+            self.frame_stats.mark_request()
+
+        elapsed = (time.time() - self._lastDraw) * 1000.
+        self._redrawTimer.start(int(max(0, self.frame_interval - elapsed)))
+
+    def flush_redraw(self):
+        """Perform a scheduled redraw right now"""
+        if self._redrawTimer is not None and self._redrawTimer.isActive():
+            self.draw()
+
+    def enable_instrumentation(self, capacity=1000, overlay=False):
+        """
+        Record the time of every frame in a FrameStats, which is returned.
+
+        The latest *capacity* frames are kept. If *overlay* is True, the
+        frame rate and the time of the latest frame are shown on top of
+        the plot.
+        """
+        if self.frame_stats is None:
+            self.frame_stats = FrameStats(capacity)
+
+        if overlay and self._statsOverlay is None:
+            self._statsOverlay = StatsOverlay(self.frame_stats, self)
+        elif not overlay and self._statsOverlay is not None:
+            self._statsOverlay.deleteLater()
+            self._statsOverlay = None
+
+        return self.frame_stats
+
+    def disable_instrumentation(self):
+        if self._statsOverlay is not None:
+            self._statsOverlay.deleteLater()
+            self._statsOverlay = None
+
+        self.frame_stats = None
+
+    def enable_lod(self, line, factor=4):
+        """
+        Show a decimated version of *line* that matches the current view.
+
+        Meant for lines with millions of points. The x data of the line
+        has to be increasing. Data can be added with the *append* method
+        of the returned LODLine.
+        """
+        if line in self._lodLines:
+            return self._lodLines[line]
+
+        lod = LODLine(line, factor=factor)
+        self._lodLines[line] = lod
+        self.request_redraw()
+
+        return lod
+
+    def disable_lod(self, line):
+        """Show the full resolution data of *line* again"""
+        lod = self._lodLines.pop(line, None)
+
+        if lod is not None:
+            lod.remove()
+            self.request_redraw()
+
+    def stream_line(self, name, capacity=100000, axes=None, **kwargs):
+        """
+        Create a line for live data, or get it if it already exists.
+
+        The returned StreamLine keeps the latest *capacity* points appended
+        with its *append* method. Redraws are throttled to the frame rate
+        of the widget and the axes are autoscaled at most every
+        *autoscale_interval* seconds, unless the user has zoomed or panned
+        away from the initial view. Additional keyword arguments are passed
+        to plot.
+        """
+        if name in self._streams:
+            return self._streams[name]
+
+        if axes is None:
+            axes = self.axes
+
+        line = axes.plot([], [], label=name, **kwargs)[0]
+        stream = StreamLine(self, line, capacity)
+        self._streams[name] = stream
+
+        return stream
+
+    def _flush_streams(self):
+        for stream in self._streams.values():
+            if stream.flush():
+                self._autoscaleAxes.add(stream.line.axes)
+
+        if self.toolbar.user_navigated():
+            # do not overwrite the view chosen by the user
+            self._autoscaleAxes.clear()
+
+        if not self._autoscaleAxes:
+            return
+
+        remaining = self.autoscale_interval - (time.time() -
+                                               self._lastAutoscale)
+
+        if remaining > 0:
+            # make sure the latest data gets scaled even if no more
+            # data arrives, restarting keeps a single pending timeout
+            self._autoscaleTimer.start(int(remaining * 1000))
+            return
+
+        for axes in self._autoscaleAxes:
+            axes.relim()
+            axes.autoscale_view()
+
+        self._autoscaleAxes.clear()
+        self._lastAutoscale = time.time()
+        self.toolbar.set_home()
+
     @QtCore.Slot()
     def draw(self):
+        if self._redrawTimer is not None:
+            # a direct draw also satisfies all pending requests
+            self._redrawTimer.stop()
+
+        stats = self.frame_stats
+
+        if stats is not None:
+            start = clock()
+
+        if self._streams:
+            self._flush_streams()
+
         super(MatplotlibWidget, self).draw()
+        self._lastDraw = time.time()
+
+        if stats is not None:
+            stats.record(start, count_artists(self.figure))
         # adjust_axis_labels(self.axes)
         self.canvasUpdated.emit()
 
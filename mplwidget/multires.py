@@ -0,0 +1,130 @@
+'''
+Coarse-to-fine fitting of large data sets.
+
+The model is first fitted to a rebinned version of the data with few
+points, the result is refined on finer and finer versions and finally
+polished on the full data with a limited number of function evaluations.
+Most iterations of the optimiser thus evaluate the model on a small
+fraction of the points.
+'''
+
+import numpy as np
+
+from .ranges import get_sort_index
+
+
+def rebin(x, y, weights, factor):
+    '''
+    Combine every *factor* consecutive points (in the order of x) into one.
+
+    *weights* are 1 / sigma as used by lmfit. The points of a bin are
+    averaged with inverse variance weights, the weight of a bin is
+    sqrt(sum(weights ** 2)), so the chi-square of the rebinned data has the
+    same minimum as the one of the original data as long as the model is
+    about linear within a bin. Bins with zero total weight get the plain
+    mean and weight zero.
+    '''
+    index = get_sort_index(x)
+    x, y, weights = index.take(x), index.take(y), index.take(weights)
+
+    starts = np.arange(0, len(x), factor)
+    counts = np.diff(np.append(starts, len(x)))
+    w2 = weights ** 2
+    w2_sum = np.add.reduceat(w2, starts)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_bin = np.add.reduceat(w2 * x, starts) / w2_sum
+        y_bin = np.add.reduceat(w2 * y, starts) / w2_sum
+
+    empty = w2_sum == 0
+
+    if np.any(empty):
+        x_bin[empty] = (np.add.reduceat(x, starts) / counts)[empty]
+        y_bin[empty] = (np.add.reduceat(y, starts) / counts)[empty]
+
+    return x_bin, y_bin, np.sqrt(w2_sum)
+
+
+def get_factors(n, min_points=1000, step=8):
+    '''
+    Get the rebinning factors of the coarse levels for *n* points, from
+    coarse to fine. The coarsest level has at least *min_points* points,
+    consecutive levels differ by *step*.
+    '''
+    factors = []
+    factor = step
+
+    while n // factor >= min_points:
+        factors.insert(0, factor)
+        factor *= step
+
+    return factors
+
+
+def multires_fit(fit, y, x=None, weights=None, params=None, min_points=1000,
+                 step=8, max_nfev=None, iter_cb=None, **fit_kws):
+    '''
+    Fit coarse to fine.
+
+    Parameters
+    ----------
+    fit : function
+        Fit function with the signature of lmfit.Model.fit, e.g.
+        ModelContainer.fit.
+    y, x, weights, params :
+        Data and start parameters as for lmfit.Model.fit. *x* is needed
+        to rebin the data unless it is fitted directly.
+    min_points : int
+        Number of points of the coarsest level. Data with less than
+        *min_points* * *step* points is fitted directly, *max_nfev* is
+        only applied if given.
+    step : int
+        Rebinning factor between consecutive levels.
+    max_nfev : int
+        Maximum number of function evaluations of the final fit on the
+        full data, by default 20 per varying parameter.
+    iter_cb : function
+        Passed on to every fit, as are the other keyword arguments.
+
+    Returns
+    -------
+    result : lmfit.model.ModelResult
+        Result of the final fit on the full data.
+    '''
+    factors = get_factors(len(np.ravel(y)), min_points, step)
+
+    if not factors:
+        if max_nfev is not None:
+            fit_kws['max_nfev'] = max_nfev
+
+        return fit(y, x=x, weights=weights, params=params, iter_cb=iter_cb,
+                   **fit_kws)
+
+    if x is None:
+        raise ValueError('x is needed to fit coarse to fine')
+
+    y = np.asarray(y, dtype=float)
+    x = np.asarray(x, dtype=float)
+
+    if weights is None:
+        weights = np.ones(len(y))
+
+    weights = np.asarray(weights, dtype=float)
+
+    for factor in factors:
+        x_bin, y_bin, w_bin = rebin(x, y, weights, factor)
+        result = fit(y_bin, x=x_bin, weights=w_bin, params=params,
+                     iter_cb=iter_cb, **fit_kws)
+
+        if getattr(result, 'aborted', False):
+            return result
+
+        params = result.params
+
+    if max_nfev is None:
+        nvarys = sum(1 for par in params.values()
+                     if par.vary and par.expr is None)
+        max_nfev = 20 * (nvarys + 1)
+
+    return fit(y, x=x, weights=weights, params=params, iter_cb=iter_cb,
+               max_nfev=max_nfev, **fit_kws)
@@ -5,10 +5,12 @@ Created on Mon Jan 30 15:50:25 2012
 @author: strandha
 """
 from functools import partial
+import weakref
 import numpy as np
 
 from matplotlib.cbook import Stack
 from matplotlib.font_manager import FontProperties
+from matplotlib.transforms import Bbox
 
 from matplotlib.backends.qt_compat import QtCore, QtGui
 
@@ -16,6 +18,9 @@ from .axis_span import AxisSpan
 from .axis_pan import AxisPan
 from .icons import get_icon
 from .fit_widget import FitWidget
+from .instrumentation import mark_input, record_frame, start_frame
+from .picking import PickIndex
+from .redraw import emit_partial_draw, flush_redraw, request_redraw
 
 # needed for compatibility with PyQt5
 QFont = QtGui.QFont
@@ -41,15 +46,36 @@ class NavigationToolbar(QtWidgets.QToolBar):
         - right click -> context menu (self._on_click)
         - left click on axis -> zoom along axis (self._on_click)
         - click on scroll wheel -> pan plot (self._on_middle_click)
+
+    Mouse interaction targets the axes under the cursor. Limits propagate
+    to shared axes and to axes connected with link_axes.
+
+    If *useblit* is True (and the canvas supports it), panning and scroll
+    zooming only update the pixels of the affected axes while the
+    interaction is going on. Once the mouse button is released or, for
+    scrolling, after *scroll_delay* ms without further scroll events, the
+    affected axes are redrawn including their ticks, the rest of the
+    figure is not rendered again.
     """
     message = QtCore.Signal(str)
 
-    def __init__(self, canvas, parent, coordinates=False):
+    def __init__(self, canvas, parent, coordinates=False, useblit=True,
+                 scroll_delay=150):
         super(NavigationToolbar, self).__init__(parent)
         self.canvas = canvas
         canvas.toolbar = self
         self._views = Stack()
 
+        self.useblit = useblit and getattr(canvas, 'supports_blit', True)
+        self._background = None
+        self._xypress = []
+        self._scrolledAxes = set()
+
+        self._scrollTimer = QtCore.QTimer(self)
+        self._scrollTimer.setSingleShot(True)
+        self._scrollTimer.setInterval(scroll_delay)
+        self._scrollTimer.timeout.connect(self._release_scroll)
+
         self.homeAction = self.addAction(get_icon('home'), 'Home', self.home)
         self.homeAction.setToolTip('restore initial view')
         self.backAction = self.addAction(get_icon('arrow_left'),
@@ -70,6 +96,19 @@ class NavigationToolbar(QtWidgets.QToolBar):
         # needed to keep as a reference for things created in a SubMenu
         self._fitWidget = None
 
+        # PickIndex by axes, see _right_click
+        self._pickIndexes = weakref.WeakKeyDictionary()
+
+        # groups of axes with linked limits, see link_axes
+        self._links = {'x': [], 'y': []}
+        self._linkCids = {}
+
+        # extents of the axes including ticks and labels as drawn, see
+        # _redraw_axes
+        self._extents = None
+        self._idDraw = self.canvas.mpl_connect('draw_event',
+                                               self._invalidate_extents)
+
         self.set_history_buttons()
 
     def scroll_zoom(self, axes, steps, location=None, stepsize=0.1):
@@ -81,13 +120,30 @@ class NavigationToolbar(QtWidgets.QToolBar):
         ymin += (location[1] - ymin) * steps * stepsize
         ymax += (location[1] - ymax) * steps * stepsize
         axes.set_ylim(ymin, ymax)
+
+        if self.useblit:
+            # the view is pushed and the axes redrawn once scrolling stops
+            self._scrolledAxes.add(axes)
+            self._blit_axes(*self._related_axes([axes]))
+            self._scrollTimer.start()
+        else:
+            self.push_current()
+            self.dynamic_update()
+
+    def _release_scroll(self):
+        """finish a series of scroll events with a redraw of the axes"""
+        self._background = None
         self.push_current()
-        self.dynamic_update()
+        self._redraw_axes(self._scrolledAxes)
+        self._scrolledAxes = set()
 
     def _on_scroll(self, event):
         if event.inaxes is None:
             return
 
+        mark_input(self.canvas, 'scroll')
+        self._axes_extents()
+
         if self._views.empty():
             self.push_current()
 
@@ -119,10 +175,24 @@ class NavigationToolbar(QtWidgets.QToolBar):
 
             self._xypress = []
 
+            if self._scrollTimer.isActive():
+                # the cached background would miss the last scroll zoom
+                self._scrollTimer.stop()
+                self._release_scroll()
+
+            if self.useblit:
+                self._grab_background()
+
+            self._axes_extents()
+
             for i, a in enumerate(self.canvas.figure.get_axes()):
                 if (x is not None and y is not None and a.in_axes(event) and
                         a.get_navigate() and a.can_pan()):
                     pan = AxisPan(a, event)
+
+                    if self.useblit:
+                        pan.grab(self.canvas)
+
                     self._xypress.append((pan, i))
                     self.canvas.mpl_disconnect(self._idDrag)
                     self._idDrag = self.canvas.mpl_connect('motion_notify_event',
@@ -130,15 +200,31 @@ class NavigationToolbar(QtWidgets.QToolBar):
 
     def drag_pan(self, event):
         """drag callback in pan mode"""
+        mark_input(self.canvas, 'pan')
+
         for a, ind in self._xypress:
             a.drag(event)
 
-        self.dynamic_update()
+        if self._background is None:
+            self.dynamic_update()
+            return
+
+        # move the cached pixels instead of rendering the data again,
+        # the figure is drawn properly in release_pan
+        start = start_frame(self.canvas)
+        self.canvas.restore_region(self._background)
+
+        for a, ind in self._xypress:
+            a.blit(self.canvas, event)
+            self.canvas.blit(a.bbox)
+
+        record_frame(self.canvas, start, len(self._xypress))
 
     def release_pan(self, event):
         """the release mouse button callback in pan mode"""
 
         self.canvas.mpl_disconnect(self._idDrag)
+        self._background = None
 
         for a, ind in self._xypress:
             del a
@@ -146,32 +232,53 @@ class NavigationToolbar(QtWidgets.QToolBar):
         if not self._xypress:
             return
 
+        axes = [a.axes for a, ind in self._xypress]
         self._xypress = []
         self.push_current()
+        self._redraw_axes(axes)
 
-        self.draw()
+    def _axes_at(self, event):
+        """get the axes under the mouse, including its ticks and labels"""
+        if event.inaxes is not None:
+            return event.inaxes
+
+        for a in reversed(self.canvas.figure.get_axes()):
+            if a.xaxis.contains(event)[0] or a.yaxis.contains(event)[0]:
+                return a
+
+        return None
 
     def _left_click(self, event):
-        ax = self.canvas.figure.gca()
+        ax = self._axes_at(event)
+
+        if ax is None:
+            return
+
         if ax.get_xaxis().contains(event)[0]:
             def zoom(xmin, xmax):
+                mark_input(self.canvas, 'axis_zoom')
+                self._axes_extents()
+
                 if self._views.empty():
                     self.push_current()
 
                 ax.set_xlim(xmin, xmax)
                 self.push_current()
-                self.dynamic_update()
+                self._redraw_axes([ax])
 
             self.axzoom = AxisSpan(ax, event, zoom, 'horizontal',
                                    minspan=0.001, color='w')
         if ax.get_yaxis().contains(event)[0]:
             def zoom(ymin, ymax):
+                mark_input(self.canvas, 'axis_zoom')
+                self._axes_extents()
+
                 if self._views.empty():
                     self.push_current()
 
                 ax.set_ylim(ymin, ymax)
                 self.push_current()
-                self.dynamic_update()
+                self._redraw_axes([ax])
 
             self.axzoom = AxisSpan(ax, event, zoom, 'vertical',
                                    minspan=0.001, color='w')
@@ -181,22 +288,21 @@ class NavigationToolbar(QtWidgets.QToolBar):
         sub_menus = []
         add_these = []
 
+        axes = self._axes_at(event) or self.canvas.figure.gca()
+        index = self._pick_index(axes)
+
         # check which artists have been clicked
-        for artist in self.canvas.figure.gca().get_children():
-            picked, props = artist.contains(event)
-            if picked:
-                # check if artist is part of bar graph
-                for container in self.canvas.figure.gca().containers:
-                    if artist in container.get_children():
-                        if container not in add_these:
-                            add_these.append(container)
-                        break
-                else:
-                    if not str(artist).startswith("Rectangle(0,0"):
-                        sub_menus.append(SubMenu(artist, parent=self))
+        for artist in index.hit(event):
+            # check if artist is part of bar graph
+            container = index.container(artist)
+
+            if container is not None:
+                if container not in add_these:
+                    add_these.append(container)
+            elif not str(artist).startswith("Rectangle(0,0"):
+                sub_menus.append(SubMenu(artist, parent=self))
 
-        for artist in [self.canvas.figure.gca().xaxis.label,
-                       self.canvas.figure.gca().yaxis.label]:
+        for artist in [axes.xaxis.label, axes.yaxis.label]:
 
             picked, props = artist.contains(event)
             if picked:
@@ -211,23 +317,272 @@ class NavigationToolbar(QtWidgets.QToolBar):
         point = QtCore.QPoint(event.x, self.canvas.height() - event.y)
         menu.exec_(self.canvas.mapToGlobal(point))
 
+    def _pick_index(self, axes):
+        # drop the indexes of axes which have been removed from the figure
+        figure_axes = self.canvas.figure.axes
+
+        for other in list(self._pickIndexes.keys()):
+            if other not in figure_axes:
+                self._pickIndexes.pop(other).disconnect()
+
+        try:
+            return self._pickIndexes[axes]
+        except KeyError:
+            index = PickIndex(axes)
+            self._pickIndexes[axes] = index
+
+            return index
+
     def back(self, *args):
         """move back up the view lim stack"""
+        mark_input(self.canvas, 'back')
+        self._axes_extents()
         self._views.back()
         self.set_history_buttons()
         self._update_view()
 
     def dynamic_update(self):
-        self.canvas.draw()
+        request_redraw(self.canvas)
+
+    def _grab_background(self):
+        """cache the pixels of the whole figure as currently shown"""
+        if self._background is None:
+            flush_redraw(self.canvas)
+            self._background = self.canvas.copy_from_bbox(
+                self.canvas.figure.bbox)
+
+    def _blit_axes(self, *axes_list):
+        """
+        Redraw only the content of the axes on top of the cached background.
+
+        Axis ticks and labels are not updated, this is left to the next
+        redraw of the axes.
+        """
+        self._grab_background()
+        start = start_frame(self.canvas)
+        self.canvas.restore_region(self._background)
+        count = 0
+
+        for axes in axes_list:
+            axes.draw_artist(axes.patch)
+
+            skip = (axes.patch, axes.xaxis, axes.yaxis)
+            artists = [a for a in axes.get_children()
+                       if a not in skip and a.get_visible()]
+
+            for artist in sorted(artists, key=lambda a: a.get_zorder()):
+                axes.draw_artist(artist)
+
+            self.canvas.blit(axes.bbox)
+            count += len(artists)
+
+        record_frame(self.canvas, start, count)
+
+    def link_axes(self, *axes, **kwargs):
+        """
+        Keep the limits of *axes* in sync when navigating.
+
+        *which* ('x', 'y' or 'xy') selects the linked limits. In contrast
+        to shared axes, linked axes keep their own tick locators and
+        formatters.
+        """
+        which = kwargs.pop('which', 'x')
+
+        for key in which:
+            group = set(axes)
+            groups = []
+
+            for other in self._links[key]:
+                if other.isdisjoint(group):
+                    groups.append(other)
+                else:
+                    group.update(other)
+
+            groups.append(group)
+            self._links[key] = groups
+
+            for a in axes:
+                if (a, key) not in self._linkCids:
+                    cid = a.callbacks.connect(
+                        '{0}lim_changed'.format(key),
+                        partial(self._propagate_limits, key))
+                    self._linkCids[(a, key)] = cid
+
+    def _propagate_limits(self, key, axes):
+        get_lim = 'get_{0}lim'.format(key)
+        set_lim = 'set_{0}lim'.format(key)
+        lim = getattr(axes, get_lim)()
+
+        for group in self._links[key]:
+            if axes not in group:
+                continue
+
+            for other in group:
+                # the callback of other stops here, its limits are equal
+                if tuple(getattr(other, get_lim)()) != tuple(lim):
+                    getattr(other, set_lim)(lim)
+
+    def _related_axes(self, axes_list):
+        """
+        Get *axes_list* together with all axes sharing or linked with them.
+
+        The axes are returned in the order of the figure.
+        """
+        related = set()
+        todo = list(axes_list)
+
+        while todo:
+            a = todo.pop()
+
+            if a in related:
+                continue
+
+            related.add(a)
+            todo.extend(a.get_shared_x_axes().get_siblings(a))
+            todo.extend(a.get_shared_y_axes().get_siblings(a))
+
+            for key in 'xy':
+                for group in self._links[key]:
+                    if a in group:
+                        todo.extend(group)
+
+        return [a for a in self.canvas.figure.get_axes() if a in related]
+
+    def _invalidate_extents(self, event=None):
+        # _redraw_axes keeps the extents up to date itself
+        if getattr(event, 'redrawn_axes', None) is None:
+            self._extents = None
+
+    def _axes_extents(self):
+        """
+        Get the extents of all axes including ticks and labels as shown.
+
+        Has to be called before the limits change, the extents are needed
+        to erase the old ticks when the axes are redrawn.
+        """
+        # a pending draw would make the extents outdated right away
+        flush_redraw(self.canvas)
+
+        if self._extents is None:
+            self._extents = {}
+
+        get_renderer = getattr(self.canvas, 'get_renderer', None)
+
+        if get_renderer is None:
+            return self._extents
+
+        renderer = get_renderer()
+
+        for a in self.canvas.figure.get_axes():
+            if a not in self._extents:
+                self._extents[a] = a.get_tightbbox(renderer)
+
+        return self._extents
+
+    def _redraw_axes(self, axes_list):
+        """
+        Redraw *axes_list* and all axes sharing or linked with them.
+
+        Only the regions covered by these axes including their ticks and
+        labels are drawn again and blitted, the other axes of the figure
+        are not rendered. Falls back to a full redraw if blitting is not
+        possible. draw_event is emitted with the redrawn axes before the
+        regions are blitted, so animated artists can be drawn on top.
+        """
+        axes_list = self._related_axes(axes_list)
+
+        if not axes_list:
+            return
+
+        figure = self.canvas.figure
+
+        if (not self.useblit or
+                not hasattr(self.canvas, 'get_renderer') or
+                figure.patch.get_facecolor()[3] < 1):
+            # the background has to be opaque to erase the old content
+            self.draw()
+            return
+
+        extents = self._axes_extents()
+        renderer = self.canvas.get_renderer()
+        start = start_frame(self.canvas)
+        self._refresh_locators(axes_list)
+
+        regions = []
+
+        for a in axes_list:
+            new = a.get_tightbbox(renderer)
+            old = extents.get(a)
+            extents[a] = new
+
+            if old is not None:
+                new = Bbox.union([old, new])
+
+            # whole pixels, a partly erased pixel would be drawn twice
+            x0, y0, x1, y1 = new.padded(2).extents
+            regions.append(Bbox.from_extents(np.floor(x0), np.floor(y0),
+                                             np.ceil(x1), np.ceil(y1)))
+
+        # drawing the neighbours of the axes touches pixels outside of the
+        # regions, they are restored from this copy
+        saved = self.canvas.copy_from_bbox(figure.bbox)
+        pixels = []
+
+        for region in regions:
+            self._draw_region(region, extents)
+            pixels.append(self.canvas.copy_from_bbox(region))
+
+        self.canvas.restore_region(saved)
+
+        for region_pixels in pixels:
+            self.canvas.restore_region(region_pixels)
+
+        emit_partial_draw(self.canvas, renderer, axes_list)
+
+        for region in regions:
+            self.canvas.blit(region)
+
+        record_frame(self.canvas, start, len(axes_list), kind='axes')
+
+        updated = getattr(self.canvas, 'canvasUpdated', None)
+
+        if updated is not None:
+            updated.emit()
+
+    def _draw_region(self, region, extents):
+        """erase *region* and draw all axes overlapping it"""
+        figure = self.canvas.figure
+        patch = figure.patch
+        clip_box, clip_on = patch.get_clip_box(), patch.get_clip_on()
+
+        patch.set_clip_box(region)
+        patch.set_clip_on(True)
+        figure.draw_artist(patch)
+        patch.set_clip_box(clip_box)
+        patch.set_clip_on(clip_on)
+
+        renderer = self.canvas.get_renderer()
+
+        for a in figure.get_axes():
+            if a.get_visible() and extents[a].overlaps(region):
+                figure.draw_artist(a)
+
+        for artist in list(figure.texts) + list(figure.legends):
+            if artist.get_window_extent(renderer).overlaps(region):
+                figure.draw_artist(artist)
 
     def forward(self, *args):
         """Move forward in the view lim stack"""
+        mark_input(self.canvas, 'forward')
+        self._axes_extents()
         self._views.forward()
         self.set_history_buttons()
         self._update_view()
 
     def home(self, *args):
         """Restore the original view"""
+        mark_input(self.canvas, 'home')
+        self._axes_extents()
         view = self._views.home()
         self._views.clear()
         self._views.push(view)
@@ -252,20 +607,41 @@ class NavigationToolbar(QtWidgets.QToolBar):
             if p == n - 1:
                 self.forwardAction.setEnabled(False)
 
-    def push_current(self):
-        """push the current view limits onto the stack"""
-        lims = []
+    def _current_lims(self):
+        """get the limits of all axes keyed by the axes"""
+        lims = {}
         for a in self.canvas.figure.get_axes():
             xmin, xmax = a.get_xlim()
             ymin, ymax = a.get_ylim()
-            lims.append((xmin, xmax, ymin, ymax))
+            lims[a] = (xmin, xmax, ymin, ymax)
+
+        return lims
 
-        self._views.push(lims)
+    def push_current(self):
+        """push the current view limits onto the stack"""
+        self._views.push(self._current_lims())
         self.set_history_buttons()
 
+    def set_home(self):
+        """replace the home view by the current view limits"""
+        if not self._views.empty():
+            self._views._elements[0] = self._current_lims()
+
+    def user_navigated(self):
+        """
+        Check if the user has moved away from the home view or is
+        currently panning or zooming.
+        """
+        return (self._views._pos > 0 or bool(self._xypress) or
+                self._scrollTimer.isActive())
+
     def draw(self):
         """Redraw the canvases, update the locators"""
-        for a in self.canvas.figure.get_axes():
+        self._refresh_locators(self.canvas.figure.get_axes())
+        request_redraw(self.canvas)
+
+    def _refresh_locators(self, axes_list):
+        for a in axes_list:
             xaxis = getattr(a, 'xaxis', None)
             yaxis = getattr(a, 'yaxis', None)
             locators = []
@@ -278,7 +654,6 @@ class NavigationToolbar(QtWidgets.QToolBar):
 
             for loc in locators:
                 loc.refresh()
-        self.canvas.draw()
 
     def _update_view(self):
         """Update the viewlim and position from the view and
@@ -289,12 +664,22 @@ class NavigationToolbar(QtWidgets.QToolBar):
         if lims is None:
             return
 
-        for i, a in enumerate(self.canvas.figure.get_axes()):
-            xmin, xmax, ymin, ymax = lims[i]
-            a.set_xlim((xmin, xmax))
-            a.set_ylim((ymin, ymax))
+        changed = []
+
+        for a in self.canvas.figure.get_axes():
+            # axes added after the view has been pushed keep their limits
+            if a not in lims:
+                continue
+
+            xmin, xmax, ymin, ymax = lims[a]
+
+            if (tuple(a.get_xlim()) + tuple(a.get_ylim()) !=
+                    (xmin, xmax, ymin, ymax)):
+                a.set_xlim((xmin, xmax))
+                a.set_ylim((ymin, ymax))
+                changed.append(a)
 
-        self.draw()
+        self._redraw_axes(changed)
 
     def fit(self, artist):
         if self._fitWidget is None:
@@ -364,18 +749,18 @@ class SubMenu(QtWidgets.QMenu):
             except:
                 print('unexpected error')
 
-        self.parent.canvas.draw()
+        request_redraw(self.parent.canvas)
 
     def edit_text(self, getter, setter):
         text, ok = QtWidgets.QInputDialog.getText(self, 'Edit Text', 'Text:',
                                                   text=getter())
         if ok:
             setter(text)
-            self.parent.canvas.draw()
+            request_redraw(self.parent.canvas)
 
     def grid(self):
         self.artist.grid()
-        self.parent.canvas.draw()
+        request_redraw(self.parent.canvas)
 
     def logscale(self):
         if self.artist.get_scale() == 'linear':
@@ -383,7 +768,7 @@ class SubMenu(QtWidgets.QMenu):
         else:
             self.artist.set_scale('linear')
 
-        self.parent.canvas.draw()
+        request_redraw(self.parent.canvas)
 
     def font(self):
         qt_font = _convert_font_toQT(self.artist.get_fontproperties())
@@ -391,7 +776,7 @@ class SubMenu(QtWidgets.QMenu):
 
         if ok:
             self.artist.set_fontproperties(_convert_font_fromQT(font))
-            self.parent.canvas.draw()
+            request_redraw(self.parent.canvas)
 
     def color(self):
         from matplotlib.colors import colorConverter
@@ -405,7 +790,7 @@ class SubMenu(QtWidgets.QMenu):
                 self.artist.set_markeredgecolor(color.getRgbF())
                 self.artist.set_markerfacecolor(color.getRgbF())
 
-        self.parent.canvas.draw()
+        request_redraw(self.parent.canvas)
 
     def pop_up(self):
         point = QtCore.QPoint(self.event.mouseevent.x,
@@ -4,6 +4,8 @@ Created on Feb 16, 2015
 @author: strandha
 '''
 
+import bisect
+
 from matplotlib.backends.qt_compat import QtCore, QtGui
 import numpy as np
 
@@ -14,103 +16,252 @@ except ImportError:
     QtWidgets = QtGui
 
 
-class ParameterGrid(QtWidgets.QWidget):
+PARAMETER_DTYPE = np.dtype([('value', float),
+                            ('min', float),
+                            ('max', float),
+                            ('vary', bool)])
+
+
+def _as_float(value):
+    if value is None:
+        return np.nan
+
+    return float(value)
+
+
+class ParameterTableModel(QtCore.QAbstractTableModel):
+    '''
+    Table model holding name, value, bounds and vary state of fit
+    parameters.
+
+    The values are kept in a numpy record array with one row per
+    parameter, sorted by name. Setting new parameters only inserts and
+    removes the rows that changed. Names of parameters edited since the
+    last call of takeChanges() are collected in *dirty*.
+    '''
     updatedPars = QtCore.Signal()
 
-    def __init__(self, parameters, parent=None):
-        super(ParameterGrid, self).__init__(parent=parent)
+    headers = ['Parameter Name', 'Value', 'Lower', 'Upper', 'Fixed']
+    fields = [None, 'value', 'min', 'max', 'vary']
 
-        self.parameters = parameters
+    def __init__(self, parameters=None, parent=None):
+        super(ParameterTableModel, self).__init__(parent)
 
-        layout = self.createLayout()
+        self.names = []
+        self.rows = {}
+        self.record = np.zeros(0, dtype=PARAMETER_DTYPE)
+        self.dirty = set()
 
-        self.setLayout(layout)
+        if parameters:
+            self.updateParameters(parameters)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.names)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if (role == QtCore.Qt.DisplayRole and
+                orientation == QtCore.Qt.Horizontal):
+            return self.headers[section]
+
+        return None
+
+    def flags(self, index):
+        col = index.column()
+
+        if col == 0:
+            return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+        elif col == 4:
+            return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsUserCheckable
+        else:
+            return (QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable |
+                    QtCore.Qt.ItemIsEditable)
 
-    def createLayout(self):
-        layout = QtWidgets.QGridLayout()
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
 
-        # header row
-        layout.addWidget(QtWidgets.QLabel('<b>Parameter Name</b>'), 0, 0)
-        layout.addWidget(QtWidgets.QLabel('<b>Value</b>'), 0, 1)
-        layout.addWidget(QtWidgets.QLabel('<b>Lower</b>'), 0, 2)
-        layout.addWidget(QtWidgets.QLabel('<b>Upper</b>'), 0, 3)
-        layout.addWidget(QtWidgets.QLabel('<b>Fixed</b>'), 0, 4)
-        layout.itemAt(0).widget().setSizePolicy(QtWidgets.QSizePolicy.Fixed,
-                                                QtWidgets.QSizePolicy.Fixed)
+        row, col = index.row(), index.column()
 
-        for name, par in sorted(self.parameters.items()):
-            self._addRow(layout, par)
+        if col == 0:
+            if role == QtCore.Qt.DisplayRole:
+                return self.names[row]
+            elif role == QtCore.Qt.TextAlignmentRole:
+                return QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter
+        elif col == 4:
+            if role == QtCore.Qt.CheckStateRole:
+                if self.record['vary'][row]:
+                    return QtCore.Qt.Unchecked
+                return QtCore.Qt.Checked
+        else:
+            value = float(self.record[self.fields[col]][row])
 
-        return layout
+            if role == QtCore.Qt.DisplayRole:
+                return '{0:.6g}'.format(value)
+            elif role == QtCore.Qt.EditRole:
+                return repr(value)
+            elif role == QtCore.Qt.TextAlignmentRole:
+                return QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter
 
-    def _addRow(self, layout, parameter):
-        row = layout.rowCount()
+        return None
 
-        layout.addWidget(QtWidgets.QLabel(parameter.name), row, 0,
-                         QtCore.Qt.AlignRight)
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid():
+            return False
 
-        sb = QtWidgets.QDoubleSpinBox()
-        sb.valueChanged.connect(self.updatedPars.emit)
-        sb.setRange(-np.inf, np.inf)
-        if parameter.value is not None:
-            sb.setValue(parameter.value)
+        row, col = index.row(), index.column()
 
-        layout.addWidget(sb, row, 1)
+        if col == 4 and role == QtCore.Qt.CheckStateRole:
+            self.record['vary'][row] = value != QtCore.Qt.Checked
+        elif col in (1, 2, 3) and role == QtCore.Qt.EditRole:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                return False
 
-        sb = QtWidgets.QDoubleSpinBox()
-        sb.valueChanged.connect(self.updatedPars.emit)
-        sb.setRange(-np.inf, np.inf)
-        if parameter.min is not None:
-            sb.setValue(parameter.min)
+            if self.record[self.fields[col]][row] == value:
+                return True
 
-        layout.addWidget(sb, row, 2)
+            self.record[self.fields[col]][row] = value
+        else:
+            return False
 
-        sb = QtWidgets.QDoubleSpinBox()
-        sb.valueChanged.connect(self.updatedPars.emit)
-        sb.setRange(-np.inf, np.inf)
-        if parameter.max is not None:
-            sb.setValue(parameter.max)
+        self.dirty.add(self.names[row])
 
-        layout.addWidget(sb, row, 3)
+        self.dataChanged.emit(index, index)
+        self.updatedPars.emit()
 
-        cb = QtWidgets.QCheckBox()
-        cb.stateChanged.connect(self.updatedPars.emit)
-        cb.setChecked(not parameter.vary)
-        layout.addWidget(cb, row, 4, QtCore.Qt.AlignCenter)
+        return True
+
+    def updateParameters(self, parameters):
+        '''
+        Show *parameters* (lmfit.Parameters or dict of Parameter).
+
+        Rows of parameters which are not in *parameters* are removed, new
+        ones are inserted and the values of all others are updated in place.
+        '''
+        names = sorted(parameters.keys())
+        keep = set(names)
+
+        # remove from the bottom, so the rows above keep their index
+        for row in reversed(range(len(self.names))):
+            if self.names[row] not in keep:
+                self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                del self.names[row]
+                self.record = np.delete(self.record, row)
+                self.endRemoveRows()
+
+        present = set(self.names)
+
+        for name in names:
+            if name in present:
+                continue
+
+            row = bisect.bisect_left(self.names, name)
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self.names.insert(row, name)
+            self.record = np.insert(self.record, row,
+                                    np.zeros(1, dtype=PARAMETER_DTYPE))
+            self.endInsertRows()
+
+        self.rows = dict((name, row) for row, name in enumerate(self.names))
+
+        record = np.zeros(len(names), dtype=PARAMETER_DTYPE)
+
+        for row, name in enumerate(names):
+            par = parameters[name]
+            record[row] = (_as_float(par.value), _as_float(par.min),
+                           _as_float(par.max), par.vary)
+
+        changed = np.flatnonzero(record != self.record)
+        self.record = record
+        self.dirty.clear()
+
+        if len(changed) > 0:
+            self.dataChanged.emit(self.index(int(changed[0]), 0),
+                                  self.index(int(changed[-1]),
+                                             len(self.headers) - 1))
+
+    def getParameter(self, name):
+        '''Get the (value, min, max, vary) record of parameter *name*'''
+        return self.record[self.rows[name]]
+
+    def _values(self, name):
+        value, lower, upper, vary = self.record[self.rows[name]].tolist()
+
+        return {'value': value,
+                'lower': lower,
+                'upper': upper,
+                'fixed': not vary}
 
     def getValues(self):
-        layout = self.layout()
-        values = {}
+        return dict((name, self._values(name)) for name in self.names)
+
+    def takeChanges(self):
+        '''Get the values of all edited parameters and reset the dirty set'''
+        changes = dict((name, self._values(name)) for name in self.dirty)
+        self.dirty.clear()
+
+        return changes
+
+
+class FloatDelegate(QtWidgets.QStyledItemDelegate):
+    '''Edit floats with a line edit, which unlike a spin box accepts inf'''
+    def createEditor(self, parent, option, index):
+        editor = QtWidgets.QLineEdit(parent)
+        # commit while typing, the widget debounces the updates
+        editor.textEdited.connect(lambda text: self.commitData.emit(editor))
+
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setText(index.data(QtCore.Qt.EditRole))
 
-        for i in xrange(1, layout.rowCount()):
-            name = str(layout.itemAtPosition(i, 0).widget().text())
-            values[name] = {}
-            value = layout.itemAtPosition(i, 1).widget().value()
-            values[name]['value'] = value
-            lower = layout.itemAtPosition(i, 2).widget().value()
-            values[name]['lower'] = lower
-            upper = layout.itemAtPosition(i, 3).widget().value()
-            values[name]['upper'] = upper
-            fixed = layout.itemAtPosition(i, 4).widget().isChecked()
-            values[name]['fixed'] = fixed
+    def setModelData(self, editor, model, index):
+        model.setData(index, str(editor.text()), QtCore.Qt.EditRole)
 
-        return values
+
+class ParameterTable(QtWidgets.QTableView):
+    def __init__(self, model, parent=None):
+        super(ParameterTable, self).__init__(parent=parent)
+
+        self.setModel(model)
+        self.setItemDelegate(FloatDelegate(self))
+        self.verticalHeader().hide()
+        self.horizontalHeader().setStretchLastSection(True)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.AllEditTriggers)
 
 
 class ParameterWidget(QtWidgets.QWidget):
     guessClicked = QtCore.Signal()
     valueChanged = QtCore.Signal()
 
-    def __init__(self, parameters, parent=None):
+    def __init__(self, parameters, parent=None, debounce=200):
         super(ParameterWidget, self).__init__(parent=parent)
 
         layout = QtWidgets.QVBoxLayout()
 
-        self.parGrid = ParameterGrid(parameters, parent=self)
-        self.parGrid.updatedPars.connect(self.valueChanged.emit)
-        self.parGrid.setSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding,
-                                   QtWidgets.QSizePolicy.MinimumExpanding)
-        layout.addWidget(self.parGrid)
+        # collect edits and emit valueChanged once typing pauses
+        self._changeTimer = QtCore.QTimer(self)
+        self._changeTimer.setSingleShot(True)
+        self._changeTimer.setInterval(debounce)
+        self._changeTimer.timeout.connect(self.valueChanged.emit)
+
+        self.parModel = ParameterTableModel(parameters, parent=self)
+        self.parModel.updatedPars.connect(self._changeTimer.start)
+
+        self.parTable = ParameterTable(self.parModel, parent=self)
+        self.parTable.setSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding,
+                                    QtWidgets.QSizePolicy.MinimumExpanding)
+        layout.addWidget(self.parTable)
 
         guessButton = QtWidgets.QPushButton('&Guess')
         guessButton.clicked.connect(self.guessClicked.emit)
@@ -123,14 +274,21 @@ class ParameterWidget(QtWidgets.QWidget):
         self.setLayout(layout)
 
     def updateParameters(self, parameters):
-        idx = self.children().index(self.parGrid)
-        self.layout().removeWidget(self.parGrid)
-        self.parGrid = ParameterGrid(parameters)
-        self.parGrid.updatedPars.connect(self.valueChanged.emit)
-        self.parGrid.setSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding,
-                                   QtWidgets.QSizePolicy.MinimumExpanding)
-        self.layout().insertWidget(0, self.parGrid)
-        self.children()[idx].setParent(None)
+        # edits still waiting for the timer belong to the old parameters
+        self.flushChanges()
+        self.parModel.updateParameters(parameters)
+
+    def flushChanges(self):
+        '''Emit valueChanged now if edits are still waiting for the timer'''
+        if self._changeTimer.isActive():
+            self._changeTimer.stop()
+            self.valueChanged.emit()
+
+    def takeChanges(self):
+        return self.parModel.takeChanges()
 
     def getValues(self):
-        return self.parGrid.getValues()
+        return self.parModel.getValues()
+
+    def getParameter(self, name):
+        return self.parModel.getParameter(name)
@@ -0,0 +1,152 @@
+'''
+Automatic start values for models with several peaks.
+
+The peaks of the data are detected once, the most prominent ones are
+assigned to the peak-like components of the model in order of x and every
+component guesses its start values from the data around its peak. The
+other components, e.g. a background, guess from the data outside of the
+peaks.
+'''
+
+import numpy as np
+from lmfit.models import StepModel
+from scipy.signal import find_peaks, peak_widths
+
+from .ranges import Range, get_sort_index
+
+
+# a component is peak-like if it has all parameters of one of the sets
+PEAK_PARAMETERS = [('center', 'sigma'), ('mu',)]
+
+# models with the parameters of a peak which are not peak-like
+NON_PEAK_MODELS = (StepModel,)
+
+
+def is_peak(component):
+    '''Whether *component* (lmfit.Model) describes a single peak'''
+    if isinstance(component, NON_PEAK_MODELS):
+        return False
+
+    names = set(component._param_root_names)
+
+    return any(names.issuperset(params) for params in PEAK_PARAMETERS)
+
+
+def estimate_noise(y):
+    '''Standard deviation of the noise of *y* from its point to point
+    differences'''
+    if len(y) < 2:
+        return 0.
+
+    return 1.4826 * np.median(np.abs(np.diff(y))) / np.sqrt(2.)
+
+
+def detect_peaks(x, y, prominence=None, width=2, max_peaks=None):
+    '''
+    Find the peaks in *y*.
+
+    *x* does not have to be sorted. Peaks less prominent than
+    *prominence* or narrower than *width* samples at half prominence are
+    ignored. The default prominence is the range noise spikes of y are
+    expected to cover, 2 * sqrt(2 * log(n)) times the noise for n points.
+
+    Returns
+    -------
+    peaks : dict
+        Arrays 'center', 'height' (above the surrounding data), 'fwhm',
+        'left' and 'right' (x at half height) of the peaks, sorted by
+        prominence from high to low and limited to *max_peaks*.
+    '''
+    index = get_sort_index(x)
+    xs, ys = index.sorted, index.take(np.asarray(y, dtype=float))
+
+    if prominence is None:
+        n = max(len(ys), 2)
+        prominence = 2. * np.sqrt(2. * np.log(n)) * estimate_noise(ys)
+
+    idx, props = find_peaks(ys, prominence=max(prominence, 1e-300),
+                            width=width)
+    order = np.argsort(props['prominences'])[::-1][:max_peaks]
+    idx = idx[order]
+    heights = props['prominences'][order]
+
+    if len(idx) == 0:
+        left = right = np.empty(0)
+    else:
+        _, _, left_ips, right_ips = peak_widths(
+            ys, idx, rel_height=0.5,
+            prominence_data=(heights, props['left_bases'][order],
+                             props['right_bases'][order]))
+
+        samples = np.arange(len(xs))
+        left = np.interp(left_ips, samples, xs)
+        right = np.interp(right_ips, samples, xs)
+
+    return {'center': xs[idx],
+            'height': heights,
+            'fwhm': right - left,
+            'left': left,
+            'right': right}
+
+
+def get_windows(peaks, width=1.5):
+    '''
+    Get (xmin, xmax) around every peak, extending *width* times the
+    FWHM beyond the half height points but not beyond the middle between
+    neighbouring peaks.
+    '''
+    order = np.argsort(peaks['center'])
+    center = peaks['center'][order]
+    xmin = peaks['left'][order] - width * peaks['fwhm'][order]
+    xmax = peaks['right'][order] + width * peaks['fwhm'][order]
+
+    middle = (center[1:] + center[:-1]) / 2.
+    xmin[1:] = np.maximum(xmin[1:], middle)
+    xmax[:-1] = np.minimum(xmax[:-1], middle)
+
+    windows = np.empty((len(order), 2))
+    windows[order, 0] = xmin
+    windows[order, 1] = xmax
+
+    return windows
+
+
+def guess_peaks(model, x, y, prominence=None):
+    '''
+    Guess start values for all components of *model* (ModelContainer).
+
+    Returns
+    -------
+    params : lmfit.Parameters
+        The parameters of the model updated with the guesses.
+    missing : list
+        Peak-like components for which no peak was found, their
+        parameters are unchanged.
+    '''
+    components = model.get_components()
+    peak_comps = [comp for comp in components if is_peak(comp)]
+    other = [comp for comp in components if not is_peak(comp)]
+
+    peaks = detect_peaks(x, y, prominence=prominence,
+                         max_peaks=len(peak_comps))
+    windows = get_windows(peaks)
+
+    # the components are assigned to the peaks from left to right
+    order = np.argsort(peaks['center'])
+    params = model.get_parameters()
+
+    for comp, i in zip(peak_comps, order):
+        x_sel, y_sel = Range(*windows[i]).select(x, y)
+        params.update(comp.guess(y_sel, x=x_sel))
+
+    if other:
+        background = Range(exclude=windows.tolist())
+        x_sel, y_sel = background.select(x, y)
+
+        if len(x_sel) < 2:
+            x_sel, y_sel = x, y
+
+        for comp in other:
+            params.update(comp.guess(y_sel, x=x_sel))
+
+    return params, peak_comps[len(order):]
@@ -0,0 +1,183 @@
+'''
+Fast lookup of the artists of an axes under the mouse.
+'''
+
+import weakref
+
+import numpy as np
+from matplotlib.patches import Rectangle
+
+
+class PickIndex(object):
+    '''
+    Grid of the artists of *axes* in display coordinates.
+
+    Every artist is sorted into the cells of size *cell_size* pixels its
+    bounding box (grown by *margin* pixels) overlaps, so only artists near
+    the mouse need to be tested with contains. Artists covering more than
+    *max_cells* cells or without a usable extent are always tested. The
+    index also maps the children of the containers of *axes* to their
+    container.
+
+    The index is built when it is queried and discarded whenever the
+    canvas is drawn or the limits of *axes* change. It only keeps a weak
+    reference to *axes*.
+    '''
+    def __init__(self, axes, cell_size=32, margin=5, max_cells=256):
+        self._axes = weakref.ref(axes)
+        self.cell_size = float(cell_size)
+        self.margin = margin
+        self.max_cells = max_cells
+
+        self._grid = None
+        self._always = None
+        self._order = None
+        self._containers = None
+
+        # the canvas would keep the axes alive through its figure
+        canvas = axes.figure.canvas
+        self._canvas = weakref.ref(canvas)
+        self._limCids = [axes.callbacks.connect('xlim_changed',
+                                                self.invalidate),
+                         axes.callbacks.connect('ylim_changed',
+                                                self.invalidate)]
+        self._drawCid = canvas.mpl_connect('draw_event', self.invalidate)
+
+    @property
+    def axes(self):
+        return self._axes()
+
+    def invalidate(self, *args):
+        self._grid = None
+        self._containers = None
+
+    def disconnect(self):
+        axes = self.axes
+        canvas = self._canvas()
+
+        if axes is not None:
+            for cid in self._limCids:
+                axes.callbacks.disconnect(cid)
+
+        if canvas is not None and self._drawCid is not None:
+            canvas.mpl_disconnect(self._drawCid)
+
+        self._limCids = []
+        self._drawCid = None
+
+    def _get_renderer(self):
+        get_renderer = getattr(self.axes.figure.canvas, 'get_renderer', None)
+
+        if get_renderer is None:
+            return None
+
+        return get_renderer()
+
+    def _extents(self, artists):
+        '''
+        Get the display extents (x0, y0, x1, y1) of *artists* and the
+        artists without a usable extent.
+        '''
+        renderer = self._get_renderer()
+        transData = self.axes.transData
+        rects = []
+        rect_extents = []
+        other = []
+        other_extents = []
+        unknown = []
+
+        for artist in artists:
+            # bars are the most common case for many artists, their
+            # extents are transformed at once
+            if (isinstance(artist, Rectangle) and
+                    getattr(artist, 'angle', 0) == 0 and
+                    artist.get_data_transform() is transData):
+                x, y = artist.get_x(), artist.get_y()
+                rects.append(artist)
+                rect_extents.append((x, y, x + artist.get_width(),
+                                     y + artist.get_height()))
+                continue
+
+            try:
+                bbox = artist.get_window_extent(renderer)
+            except (TypeError, AttributeError, RuntimeError):
+                bbox = None
+
+            if bbox is None:
+                unknown.append(artist)
+            else:
+                other.append(artist)
+                other_extents.append(bbox.extents)
+
+        extents = np.empty((len(rects) + len(other), 4))
+
+        if rects:
+            rect_extents = np.asarray(rect_extents, dtype=float)
+            p0 = transData.transform(rect_extents[:, :2])
+            p1 = transData.transform(rect_extents[:, 2:])
+            extents[:len(rects), :2] = np.minimum(p0, p1)
+            extents[:len(rects), 2:] = np.maximum(p0, p1)
+
+        if other:
+            extents[len(rects):] = other_extents
+
+        return rects + other, extents, unknown
+
+    def _build(self):
+        children = self.axes.get_children()
+        visible = [artist for artist in children if artist.get_visible()]
+        artists, extents, always = self._extents(visible)
+
+        finite = np.all(np.isfinite(extents), axis=1)
+        extents[~finite] = 0.
+        extents[:, :2] -= self.margin
+        extents[:, 2:] += self.margin
+        cells = (extents // self.cell_size).astype(int)
+        ncells = ((cells[:, 2] - cells[:, 0] + 1) *
+                  (cells[:, 3] - cells[:, 1] + 1))
+
+        grid = {}
+
+        for artist, (x0, y0, x1, y1), n, ok in zip(artists, cells.tolist(),
+                                                   ncells, finite):
+            if not ok or n > self.max_cells:
+                always.append(artist)
+                continue
+
+            for i in range(x0, x1 + 1):
+                for j in range(y0, y1 + 1):
+                    grid.setdefault((i, j), []).append(artist)
+
+        self._grid = grid
+        self._always = always
+        self._order = dict((artist, i) for i, artist in enumerate(children))
+
+        containers = {}
+
+        for container in self.axes.containers:
+            for child in container.get_children():
+                containers.setdefault(child, container)
+
+        self._containers = containers
+
+    def candidates(self, x, y):
+        '''Get the artists which may contain the display point (*x*, *y*)'''
+        if self._grid is None:
+            self._build()
+
+        cell = (int(x // self.cell_size), int(y // self.cell_size))
+        artists = self._grid.get(cell, []) + self._always
+
+        return sorted(artists, key=self._order.__getitem__)
+
+    def hit(self, event):
+        '''Get the artists containing the mouse *event*, in drawing order'''
+        return [artist for artist in self.candidates(event.x, event.y)
+                if artist.contains(event)[0]]
+
+    def container(self, artist):
+        '''Get the container *artist* belongs to or None'''
+        if self._containers is None:
+            self._build()
+
+        return self._containers.get(artist)
@@ -0,0 +1,171 @@
+'''
+Live preview of a fit model with its current start parameters.
+
+The curves are animated artists drawn on top of a copy of the rendered
+axes, so changing a parameter only costs the evaluation of the changed
+components and a blit.
+'''
+
+import numpy as np
+from matplotlib.lines import Line2D
+
+from .redraw import is_redrawn, request_redraw
+
+
+class ModelPreview(object):
+    '''
+    Draw *model* (a ModelContainer) and optionally its components into
+    *axes*.
+
+    The model is evaluated on a grid with one point per pixel of the
+    axes width covering the visible x range. Components are only evaluated
+    again if one of their arguments or the grid has changed.
+    '''
+    def __init__(self, axes, model, show_components=True, color='k'):
+        self.axes = axes
+        self.model = model
+        self.show_components = show_components
+        self.canvas = axes.figure.canvas
+
+        self.line = Line2D([], [], color=color, lw=2, ls=':',
+                           label='_preview', animated=True)
+        axes.add_line(self.line)
+
+        self.component_lines = {}
+        self._cache = {}
+        self._grid = None
+        self._gridKey = None
+        self._background = None
+
+        self._drawCid = self.canvas.mpl_connect('draw_event', self._on_draw)
+        self._xlimCid = axes.callbacks.connect('xlim_changed',
+                                               self._on_xlim_changed)
+
+        self.update()
+
+    def _get_grid(self):
+        xmin, xmax = sorted(self.axes.get_xlim())
+        npoints = max(int(self.axes.bbox.width), 2)
+        scale = self.axes.get_xscale()
+        key = (xmin, xmax, npoints, scale)
+
+        if key != self._gridKey:
+            if scale == 'log' and xmin > 0:
+                self._grid = np.geomspace(xmin, xmax, npoints)
+            else:
+                self._grid = np.linspace(xmin, xmax, npoints)
+
+            self._gridKey = key
+
+        return self._grid
+
+    def _component_line(self, comp):
+        try:
+            return self.component_lines[comp]
+        except KeyError:
+            line = Line2D([], [], color=self.line.get_color(), lw=1, ls=':',
+                          label='_preview', animated=True)
+            self.axes.add_line(line)
+            self.component_lines[comp] = line
+
+            return line
+
+    def _evaluate(self, comp, params, x):
+        args = comp.make_funcargs(params)
+        state = tuple(sorted((name, value) for name, value in args.items()
+                             if name not in comp.independent_vars))
+
+        try:
+            grid, old_state, y = self._cache[comp]
+        except KeyError:
+            pass
+        else:
+            if grid is x and old_state == state:
+                return y
+
+        y = np.broadcast_to(comp.eval(params, x=x), x.shape)
+        self._cache[comp] = (x, state, y)
+
+        return y
+
+    def update(self, blit=True):
+        '''Evaluate the model with its current parameters and blit it'''
+        components = self.model.get_components()
+        params = self.model.get_parameters()
+
+        for comp in list(self.component_lines):
+            if comp not in components:
+                self.component_lines.pop(comp).remove()
+                self._cache.pop(comp, None)
+
+        if not components:
+            self.line.set_data([], [])
+        else:
+            self._update_lines(components, params)
+
+        if blit:
+            self.blit()
+
+    def _update_lines(self, components, params):
+        x = self._get_grid()
+        total = np.zeros_like(x)
+
+        for comp in components:
+            y = self._evaluate(comp, params, x)
+            total += y
+
+            if len(components) > 1:
+                line = self._component_line(comp)
+                line.set_data(x, y)
+                line.set_visible(self.show_components)
+
+        self.line.set_data(x, total)
+
+    def set_show_components(self, show):
+        self.show_components = show
+
+        for line in self.component_lines.values():
+            line.set_visible(show)
+
+        self.blit()
+
+    def _lines(self):
+        return [self.line] + list(self.component_lines.values())
+
+    def _draw_lines(self):
+        for line in self._lines():
+            self.axes.draw_artist(line)
+
+    def blit(self):
+        if self._background is None:
+            request_redraw(self.canvas)
+            return
+
+        self.canvas.restore_region(self._background)
+        self._draw_lines()
+        self.canvas.blit(self.axes.bbox)
+
+    def _on_draw(self, event):
+        if not is_redrawn(event, self.axes):
+            return
+
+        # animated artists are not part of a regular draw
+        self._background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self._draw_lines()
+
+    def _on_xlim_changed(self, axes):
+        # the axes are drawn again, fully or by the toolbar, and the new
+        # curves are drawn on top in _on_draw
+        self._background = None
+        self.update(blit=False)
+
+    def remove(self):
+        self.canvas.mpl_disconnect(self._drawCid)
+        self.axes.callbacks.disconnect(self._xlimCid)
+
+        for line in self._lines():
+            line.remove()
+
+        self.component_lines = {}
+        self._cache = {}
+        request_redraw(self.canvas)
@@ -0,0 +1,207 @@
+'''
+Selection of data by x ranges.
+
+A Range is resolved against the sort order of a dataset, so selecting the
+data is a matter of slicing. For data with monotonic x, which is the
+common case for plotted lines, a single interval selects views of the
+arrays without copying them.
+'''
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+# number of datasets for which the sort order is kept
+CACHE_SIZE = 16
+
+_orders = OrderedDict()
+
+
+class SortIndex(object):
+    '''
+    Sort order of the x values of a dataset.
+
+    *order* is None if x is increasing and a slice if it is decreasing, in
+    both cases the data can be sliced without copying. Otherwise it is the
+    index array sorting x.
+    '''
+    def __init__(self, x):
+        x = np.asarray(x)
+
+        with np.errstate(invalid='ignore'):
+            steps = np.diff(x)
+
+            if np.all(steps >= 0):
+                self.order = None
+            elif np.all(steps <= 0):
+                self.order = slice(None, None, -1)
+            else:
+                self.order = np.argsort(x, kind='mergesort')
+
+        self.sorted = self.take(x)
+
+    def take(self, array):
+        '''Get *array* in the sort order of x'''
+        if self.order is None:
+            return array
+
+        return array[self.order]
+
+    def slices(self, intervals):
+        '''Get (start, stop) in sorted order for open *intervals*'''
+        xmin = [lo for lo, hi in intervals]
+        xmax = [hi for lo, hi in intervals]
+        starts = np.searchsorted(self.sorted, xmin, side='right')
+        stops = np.searchsorted(self.sorted, xmax, side='left')
+
+        return [(start, stop) for start, stop in zip(starts.tolist(),
+                                                     stops.tolist())
+                if stop > start]
+
+
+def get_sort_index(x):
+    '''Get the cached SortIndex of *x*, which is identified by identity'''
+    key = id(x)
+
+    try:
+        array, index = _orders.pop(key)
+    except KeyError:
+        pass
+    else:
+        if array is x:
+            _orders[key] = (array, index)
+            return index
+
+    index = SortIndex(x)
+    _orders[key] = (x, index)
+
+    while len(_orders) > CACHE_SIZE:
+        _orders.popitem(last=False)
+
+    return index
+
+
+class Range(object):
+    '''
+    Union of open x intervals minus excluded intervals.
+
+    Without included intervals, all data outside of the excluded intervals
+    is selected. Range(xmin, xmax) selects xmin < x < xmax as before,
+    *xmin* and *xmax* give the bounds of the included intervals.
+    '''
+    def __init__(self, xmin=-np.inf, xmax=np.inf, exclude=()):
+        self.included = []
+        self.excluded = []
+        self._version = 0
+        self._selections = OrderedDict()
+
+        if xmin > -np.inf or xmax < np.inf:
+            self.include(xmin, xmax)
+
+        for interval in exclude:
+            self.exclude(*interval)
+
+    @property
+    def xmin(self):
+        if not self.included:
+            return -np.inf
+
+        return min(lo for lo, hi in self.included)
+
+    @property
+    def xmax(self):
+        if not self.included:
+            return np.inf
+
+        return max(hi for lo, hi in self.included)
+
+    def include(self, xmin, xmax):
+        self.included.append((min(xmin, xmax), max(xmin, xmax)))
+        self._changed()
+
+    def exclude(self, xmin, xmax):
+        self.excluded.append((min(xmin, xmax), max(xmin, xmax)))
+        self._changed()
+
+    def _changed(self):
+        self._version += 1
+        self._selections.clear()
+
+    def intervals(self):
+        '''Get the selected x values as sorted, disjoint open intervals'''
+        included = sorted(self.included) or [(-np.inf, np.inf)]
+        merged = []
+
+        for lo, hi in included:
+            if merged and lo < merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(hi, merged[-1][1]))
+            else:
+                merged.append((lo, hi))
+
+        for ex_lo, ex_hi in sorted(self.excluded):
+            remaining = []
+
+            for lo, hi in merged:
+                if ex_hi <= lo or ex_lo >= hi:
+                    remaining.append((lo, hi))
+                    continue
+
+                # the bounds of the excluded interval are excluded as well
+                if lo < ex_lo:
+                    remaining.append((lo, ex_lo))
+                if ex_hi < hi:
+                    remaining.append((ex_hi, hi))
+
+            merged = remaining
+
+        return merged
+
+    def _resolve(self, x):
+        key = id(x)
+
+        try:
+            array, index, slices = self._selections[key]
+        except KeyError:
+            pass
+        else:
+            if array is x:
+                return index, slices
+
+        index = get_sort_index(x)
+        slices = index.slices(self.intervals())
+        self._selections[key] = (x, index, slices)
+
+        while len(self._selections) > CACHE_SIZE:
+            self._selections.popitem(last=False)
+
+        return index, slices
+
+    def select(self, x, *arrays):
+        '''
+        Get x and *arrays* (e.g. y and weights) within the range.
+
+        The result is in the sort order of x. Views are returned for a
+        single interval and monotonic x, otherwise copies.
+        '''
+        index, slices = self._resolve(x)
+        arrays = (x,) + arrays
+
+        if index.order is None or isinstance(index.order, slice):
+            parts = [[index.take(a)[start:stop] for start, stop in slices]
+                     for a in arrays]
+        else:
+            order = index.order
+            take = [order[start:stop] for start, stop in slices]
+
+            if len(take) != 1:
+                take = [np.concatenate(take or [order[:0]])]
+
+            parts = [[a[take[0]]] for a in arrays]
+
+        return tuple(p[0] if len(p) == 1 else np.concatenate(p or [a[:0]])
+                     for p, a in zip(parts, arrays))
+
+    def __repr__(self):
+        return 'Range(included={0!r}, excluded={1!r})'.format(self.included,
+                                                             self.excluded)
@@ -0,0 +1,56 @@
+'''
+Helpers to route redraws through the scheduler of MatplotlibWidget.
+
+Canvases which do not provide a scheduler fall back to the default
+behaviour of matplotlib.
+
+When the toolbar renders only some axes, the draw_event it emits lists
+them, listeners keeping a copy of the rendered pixels of an axes check it
+with is_redrawn.
+'''
+
+from matplotlib.backend_bases import DrawEvent
+
+
+def request_redraw(canvas):
+    '''
+    Ask *canvas* to redraw itself soon.
+
+    MatplotlibWidget merges all requests within one frame into a single
+    render, other canvases use draw_idle.
+    '''
+    method = getattr(canvas, 'request_redraw', None)
+
+    if method is None:
+        canvas.draw_idle()
+    else:
+        method()
+
+
+def flush_redraw(canvas):
+    '''
+    Perform a pending redraw of *canvas* immediately.
+
+    Needed before the rendered pixels are used directly, e.g. when they
+    are cached for blitting.
+    '''
+    method = getattr(canvas, 'flush_redraw', None)
+
+    if method is not None:
+        method()
+
+
+def emit_partial_draw(canvas, renderer, axes_list):
+    '''
+    Emit draw_event on *canvas* after only *axes_list* have been rendered.
+    '''
+    event = DrawEvent('draw_event', canvas, renderer)
+    event.redrawn_axes = list(axes_list)
+    canvas.callbacks.process('draw_event', event)
+
+
+def is_redrawn(event, axes):
+    '''Whether *axes* has been rendered in the draw *event*'''
+    redrawn = getattr(event, 'redrawn_axes', None)
+
+    return redrawn is None or axes in redrawn
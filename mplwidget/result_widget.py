@@ -12,10 +12,118 @@ try:
 except ImportError:
     QtWidgets = QtGui
 
+from lmfit.model import ModelResult
+import numpy as np
+
+from .redraw import request_redraw
+
+
+# attributes of a ModelResult describing the outcome of the fit,
+# see rebuild_result
+RESULT_ATTRIBUTES = ['method', 'nfev', 'success', 'message', 'ier',
+                     'lmdif_message', 'errorbars', 'aborted', 'chisqr',
+                     'redchi', 'aic', 'bic', 'rsquared', 'ndata', 'nvarys',
+                     'nfree', 'var_names', 'covar', 'init_vals',
+                     'init_values', 'best_values', 'best_fit', 'init_fit',
+                     'residual']
+
+# time in ms the x limits have to be unchanged before the curves are
+# evaluated again
+UPDATE_DELAY = 100
+
+
+def get_result_state(result):
+    '''
+    Get the outcome of a fit as a dict of plain, picklable values.
+
+    Together with the best fit parameters this is enough to recreate the
+    result with rebuild_result.
+    '''
+    return {name: getattr(result, name, None) for name in RESULT_ATTRIBUTES}
+
+
+def rebuild_result(model, params, state, init_params=None, data=None,
+                   weights=None, **kwargs):
+    '''
+    Recreate a ModelResult without performing the fit again.
+
+    Parameters
+    ----------
+    model : lmfit.Model
+        The fitted model.
+    params : lmfit.Parameters
+        Best fit parameters.
+    state : dict
+        Outcome of the fit as returned by get_result_state.
+    init_params : lmfit.Parameters
+        Start parameters of the fit.
+    data, weights : numpy.ndarray
+        Fitted data and weights.
+    kwargs :
+        Independent variables of the model, e.g. x.
+
+    Returns
+    -------
+    result : lmfit.model.ModelResult
+    '''
+    if init_params is None:
+        init_params = params
+
+    result = ModelResult(model, init_params, data=data, weights=weights,
+                         fcn_kws=kwargs)
+
+    for name, value in state.items():
+        setattr(result, name, value)
+
+    result.init_params = init_params
+    result.params = params
+    result.components = model.components
+
+    return result
+
+
+def get_curve_grid(axes, xmin, xmax):
+    '''
+    Get x values with one point per pixel of *axes* covering the part of
+    [*xmin*, *xmax*] which is visible.
+    '''
+    vmin, vmax = sorted(axes.get_xlim())
+    lo = max(vmin, xmin)
+    hi = min(vmax, xmax)
+
+    if not lo < hi:
+        return np.empty(0)
+
+    log = axes.get_xscale() == 'log' and lo > 0
+
+    if log:
+        fraction = np.log(hi / lo) / np.log(vmax / vmin)
+    else:
+        fraction = (hi - lo) / (vmax - vmin)
+
+    npoints = max(int(np.ceil(axes.bbox.width * fraction)), 2)
+
+    if log:
+        return np.geomspace(lo, hi, npoints)
+
+    return np.linspace(lo, hi, npoints)
+
 
 class ResultContainer(object):
-    def __init__(self, result, name='', plot=None, component_plots=None):
-        self.result = result
+    '''
+    A fit result together with the lines showing it.
+
+    A result which has been moved to a ResultStore with persist is loaded
+    from the store when it is accessed, unless its curves are plotted: then
+    it is kept in memory, since the curves are evaluated again whenever
+    the x limits change. Attributes of the fit result, e.g. params, can be
+    accessed directly on the container.
+    '''
+    def __init__(self, result=None, name='', plot=None, component_plots=None,
+                 store=None, key=None):
+        self._result = result
+        self.store = store
+        self.key = key
         self.plot = plot
         self.name = name
 
@@ -24,6 +132,53 @@ class ResultContainer(object):
 
         self.component_plots = component_plots
 
+        # fitted x range, curves are only drawn within it
+        self.xrange = None
+        self._stale = False
+        self._componentsStale = False
+        self._xlimAxes = None
+        self._xlimCid = None
+        self._updateTimer = None
+
+    @property
+    def result(self):
+        if self._result is None and self.store is not None:
+            return self.store.get(self.key)
+
+        return self._result
+
+    @result.setter
+    def result(self, result):
+        self._result = result
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name in ('result', 'store', 'key'):
+            raise AttributeError(name)
+
+        return getattr(self.result, name)
+
+    def persist(self, store, model_name, description, data_label=None):
+        '''
+        Append the result to *store* and drop the reference to it unless
+        it is plotted, it is loaded from the store again when needed.
+        '''
+        self.key = store.add(model_name, self.name, self._result, description,
+                             data_label=data_label)
+        self.store = store
+
+        if self.plot is None:
+            self._result = None
+
+    def discard(self):
+        '''Flag the result as removed in its store'''
+        if self.store is not None:
+            self.store.remove(self.key)
+
+    def restore(self):
+        '''Undo discard'''
+        if self.store is not None:
+            self.store.restore(self.key)
+
     def set_plot(self, line):
         self.plot = line
 
@@ -33,6 +188,122 @@ class ResultContainer(object):
     def get_ncomponents(self):
         return len(self.result.components)
 
+    def draw_curves(self, axes, x, show_components=True):
+        '''
+        Plot the fit and its components into *axes*.
+
+        The curves are evaluated with one point per pixel within the range
+        of *x* and evaluated again once the x limits of *axes* have stopped
+        changing. Hidden curves are only marked as stale and evaluated when
+        they are shown again.
+        '''
+        # keep the result in memory while the curves are shown
+        self._result = self.result
+        self.xrange = (np.min(x), np.max(x))
+        grid = get_curve_grid(axes, *self.xrange)
+
+        self.plot = axes.plot(grid, self._eval(grid), label=self.name,
+                              lw=2)[0]
+
+        if self.get_ncomponents() > 1:
+            for data in self._eval_components(grid):
+                line = axes.plot(grid, data, '--', color=self.plot.get_color(),
+                                 lw=2, label='_nolegend_')[0]
+                line.set_visible(show_components)
+                self.component_plots.append(line)
+
+        self._xlimAxes = axes
+        self._xlimCid = axes.callbacks.connect('xlim_changed',
+                                               self._on_xlim_changed)
+
+    def remove_curves(self):
+        '''Remove the fit and its components from their axes'''
+        if self._xlimCid is not None:
+            self._xlimAxes.callbacks.disconnect(self._xlimCid)
+            self._xlimAxes = None
+            self._xlimCid = None
+
+        if self._updateTimer is not None:
+            self._updateTimer.stop()
+
+        canvas = None
+
+        for line in [self.plot] + self.component_plots:
+            if line is not None and line.axes is not None:
+                canvas = line.figure.canvas
+                line.remove()
+
+        self.plot = None
+        self.component_plots = []
+        self.xrange = None
+
+        # the result is loaded from the store again when needed
+        if self.store is not None:
+            self._result = None
+
+        if canvas is not None:
+            request_redraw(canvas)
+
+    def _eval(self, grid):
+        if len(grid) == 0:
+            return grid
+
+        return np.broadcast_to(self.eval(x=grid), grid.shape)
+
+    def _eval_components(self, grid):
+        if len(grid) == 0:
+            return [grid] * self.get_ncomponents()
+
+        return [np.broadcast_to(data, grid.shape)
+                for data in self.eval_components(x=grid).values()]
+
+    def update_curves(self):
+        '''Evaluate the visible curves for the current x limits'''
+        if self.plot is None or self.plot.axes is None or self.xrange is None:
+            return
+
+        grid = get_curve_grid(self.plot.axes, *self.xrange)
+
+        if self.plot.get_visible():
+            self.plot.set_data(grid, self._eval(grid))
+            self._stale = False
+        else:
+            self._stale = True
+
+        if not self.component_plots:
+            return
+
+        if self.component_plots[0].get_visible():
+            for line, data in zip(self.component_plots,
+                                  self._eval_components(grid)):
+                line.set_data(grid, data)
+
+            self._componentsStale = False
+        else:
+            self._componentsStale = True
+
+    def _on_xlim_changed(self, axes):
+        if self.plot is None or self.plot.axes is None:
+            # the lines have been removed from the axes
+            self.remove_curves()
+            return
+
+        # the limits change with every mouse move while panning or zooming
+        if self._updateTimer is None:
+            self._updateTimer = QtCore.QTimer()
+            self._updateTimer.setSingleShot(True)
+            self._updateTimer.setInterval(UPDATE_DELAY)
+            self._updateTimer.timeout.connect(self._update_and_redraw)
+
+        self._updateTimer.start()
+
+    def _update_and_redraw(self):
+        if self.plot is None or self.plot.axes is None:
+            return
+
+        self.update_curves()
+        request_redraw(self.plot.figure.canvas)
+
     def toggle_plot(self, show=None):
         if self.plot is None:
             return
@@ -41,7 +312,11 @@ class ResultContainer(object):
             show = not self.plot.get_visible()
 
         self.plot.set_visible(show)
-        self.plot.figure.canvas.draw()
+
+        if show and self._stale:
+            self.update_curves()
+
+        request_redraw(self.plot.figure.canvas)
 
     def toggle_components(self, show=None):
         if len(self.component_plots) == 0:
@@ -53,7 +328,10 @@ class ResultContainer(object):
         for line in self.component_plots:
             line.set_visible(show)
 
-        line.figure.canvas.draw()
+        if show and self._componentsStale:
+            self.update_curves()
+
+        request_redraw(line.figure.canvas)
 
     def has_components(self):
         return bool(len(self.component_plots))
@@ -69,8 +347,12 @@ class ResultWidget(QtWidgets.QWidget):
     componentsToggled = QtCore.Signal(bool)
     removed = QtCore.Signal(str)
 
-    def __init__(self, parent=None, model=None):
+    def __init__(self, parent=None, model=None, store=None, data_label=None):
         self.model = model
+        self.store = store
+        # only results fitted to this data are listed from the store, all
+        # if None
+        self.data_label = data_label
 
         super(ResultWidget, self).__init__(parent=parent)
 
@@ -123,14 +405,23 @@ class ResultWidget(QtWidgets.QWidget):
             visible = result.component_plots[0].get_visible()
             self.compCheck.setChecked(visible)
 
+    def get_result_names(self):
+        '''Get the names of the results in memory and in the store'''
+        if self.model is None:
+            return []
+
+        names = set(self.model.results.keys())
+
+        if self.store is not None:
+            names.update(self.store.names(self.model.name, self.data_label))
+
+        return sorted(names)
+
     def update_result_list(self):
         self.resultList.clear()
 
-        try:
-            for result_name in sorted(self.model.results.keys()):
-                self.resultList.addItem(result_name)
-        except AttributeError:
-            pass
+        for result_name in self.get_result_names():
+            self.resultList.addItem(result_name)
 
     def set_model(self, model):
         self.model = model
@@ -138,6 +429,9 @@ class ResultWidget(QtWidgets.QWidget):
 
     def remove_result(self):
         name = str(self.resultList.currentItem().text())
+        result = self._get_result(name)
+        result.discard()
+        result.remove_curves()
         self.model.remove_result(name)
         self.removed.emit(name)
         self.update_result_list()
@@ -153,4 +447,15 @@ class ResultWidget(QtWidgets.QWidget):
 
     def _get_current_result(self):
         name = str(self.resultList.currentItem().text())
-        return self.model.results[name]
+        return self._get_result(name)
+
+    def _get_result(self, name):
+        try:
+            return self.model.results[name]
+        except KeyError:
+            # stored in an earlier session
+            key = self.store.names(self.model.name, self.data_label)[name]
+            result = ResultContainer(name=name, store=self.store, key=key)
+            self.model.add_result(name, result)
+
+            return result
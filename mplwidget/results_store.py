@@ -0,0 +1,306 @@
+'''
+Persistent store for fit results.
+
+Results are appended to a SQLite database. Each record keeps what is
+needed to evaluate and report the fit (parameters with uncertainties,
+covariance, fit statistics and the model description) but not the fitted
+data. Records are never deleted, removing a result only flags it.
+
+Results are loaded when they are accessed and only the most recently
+used ones are kept in memory.
+'''
+
+from collections import OrderedDict
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+
+from lmfit import Parameters
+import numpy as np
+
+from .result_widget import RESULT_ATTRIBUTES, rebuild_result
+
+
+DEFAULT_PATH = os.path.join('~', '.mplwidget', 'results.sqlite')
+
+# environment variable overriding DEFAULT_PATH
+PATH_VARIABLE = 'MPLWIDGET_RESULTS'
+
+# attributes of a ModelResult stored as JSON, the covariance and the
+# parameters are stored separately and the arrays depending on the data
+# are not stored at all
+STATISTICS = ['method', 'nfev', 'success', 'message', 'ier', 'lmdif_message',
+              'errorbars', 'aborted', 'chisqr', 'redchi', 'aic', 'bic',
+              'rsquared', 'ndata', 'nvarys', 'nfree', 'var_names']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    model_name TEXT NOT NULL,
+    name TEXT NOT NULL,
+    expr TEXT,
+    description TEXT NOT NULL,
+    params TEXT NOT NULL,
+    init_params TEXT,
+    statistics TEXT NOT NULL,
+    covar BLOB,
+    data_label TEXT,
+    xmin REAL,
+    xmax REAL,
+    created REAL NOT NULL,
+    removed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS results_by_model ON results (model_name, removed);
+'''
+
+
+def _plain(value):
+    '''Convert numpy scalars and arrays to types JSON can handle'''
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    elif isinstance(value, np.generic):
+        return value.item()
+    elif isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+
+    return value
+
+
+def _dump_array(array):
+    if array is None:
+        return None
+
+    buf = io.BytesIO()
+    np.save(buf, np.asarray(array), allow_pickle=False)
+
+    return sqlite3.Binary(buf.getvalue())
+
+
+def get_default_path():
+    '''Get the location of the default store'''
+    path = os.environ.get(PATH_VARIABLE, DEFAULT_PATH)
+
+    if path == ':memory:':
+        return path
+
+    return os.path.expanduser(path)
+
+
+def _load_array(blob):
+    if blob is None:
+        return None
+
+    return np.load(io.BytesIO(bytes(blob)), allow_pickle=False)
+
+
+class ResultStore(object):
+    '''
+    Append-only store of fit results backed by a SQLite file.
+
+    Parameters
+    ----------
+    path : str
+        Location of the database, defaults to the environment variable
+        MPLWIDGET_RESULTS or ~/.mplwidget/results.sqlite. Use ':memory:'
+        for a store which is not persisted.
+    cache_size : int
+        Number of results kept in memory.
+
+    The store may be used from any thread, access to the database is
+    serialised.
+    '''
+    def __init__(self, path=None, cache_size=32):
+        if path is None:
+            path = get_default_path()
+
+        if path != ':memory:':
+            path = os.path.expanduser(path)
+            directory = os.path.dirname(path)
+
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+
+    def add(self, model_name, name, result, description, data_label=None):
+        '''
+        Append *result* (lmfit.model.ModelResult) and return its key.
+
+        *description* is the description of the fitted model as returned by
+        ModelContainer.describe, it is needed to create the model again.
+        '''
+        state = dict((attr, _plain(getattr(result, attr, None)))
+                     for attr in STATISTICS)
+
+        x = result.userkws.get('x') if result.userkws else None
+
+        if x is not None and np.size(x) > 0:
+            xmin, xmax = float(np.min(x)), float(np.max(x))
+        else:
+            xmin = xmax = None
+
+        init_params = getattr(result, 'init_params', None)
+
+        if init_params is not None:
+            init_params = init_params.dumps()
+
+        # imported here, the model widget depends on the result widget
+        from .model_widget import dump_description
+
+        with self._lock:
+            cursor = self._connection.execute(
+                '''INSERT INTO results (model_name, name, expr, description,
+                                        params, init_params, statistics,
+                                        covar, data_label, xmin, xmax,
+                                        created)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (model_name, name, result.model.name,
+                 json.dumps(dump_description(description)),
+                 result.params.dumps(), init_params, json.dumps(state),
+                 _dump_array(getattr(result, 'covar', None)), data_label,
+                 xmin, xmax, time.time()))
+            self._connection.commit()
+
+            key = cursor.lastrowid
+            self._remember(key, result)
+
+        return key
+
+    def names(self, model_name, data_label=None):
+        '''
+        Get a dict of name: key of the results stored for a model, only of
+        those fitted to the data labelled *data_label* unless it is None.
+        '''
+        query = '''SELECT name, id FROM results
+                   WHERE model_name = ? AND removed = 0'''
+        args = (model_name,)
+
+        if data_label is not None:
+            query += ' AND data_label = ?'
+            args += (data_label,)
+
+        with self._lock:
+            rows = self._connection.execute(query + ' ORDER BY id',
+                                            args).fetchall()
+
+        return OrderedDict(rows)
+
+    def info(self, key):
+        '''Get the expression, data label and fitted x range of a result'''
+        with self._lock:
+            row = self._connection.execute(
+                '''SELECT expr, data_label, xmin, xmax FROM results
+                   WHERE id = ?''', (key,)).fetchone()
+
+        if row is None:
+            raise KeyError(key)
+
+        return {'expr': row[0], 'data_label': row[1],
+                'xrange': (row[2], row[3])}
+
+    def get(self, key):
+        '''Get the ModelResult stored under *key*'''
+        with self._lock:
+            try:
+                result = self._cache.pop(key)
+            except KeyError:
+                result = self._load(key)
+
+            self._remember(key, result)
+
+        return result
+
+    def remove(self, key):
+        '''Flag the result as removed, the record itself is kept'''
+        with self._lock:
+            self._connection.execute(
+                'UPDATE results SET removed = 1 WHERE id = ?', (key,))
+            self._connection.commit()
+            self._cache.pop(key, None)
+
+    def restore(self, key):
+        '''Clear the removed flag of the result stored under *key*'''
+        with self._lock:
+            self._connection.execute(
+                'UPDATE results SET removed = 0 WHERE id = ?', (key,))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._cache.clear()
+            self._connection.close()
+
+    def _remember(self, key, result):
+        self._cache[key] = result
+
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, key):
+        # imported here, the model widget depends on the result widget
+        from .model_widget import build_model, load_description
+
+        row = self._connection.execute(
+            '''SELECT description, params, init_params, statistics, covar
+               FROM results WHERE id = ?''', (key,)).fetchone()
+
+        if row is None:
+            raise KeyError(key)
+
+        description, params, init_params, statistics, covar = row
+
+        model = build_model(load_description(json.loads(description)))
+        params = Parameters().loads(params)
+
+        if init_params is not None:
+            init_params = Parameters().loads(init_params)
+
+        state = dict.fromkeys(RESULT_ATTRIBUTES)
+        state.update(json.loads(statistics))
+        state['covar'] = _load_array(covar)
+        state['best_values'] = params.valuesdict()
+
+        if init_params is not None:
+            state['init_values'] = init_params.valuesdict()
+            state['init_vals'] = list(state['init_values'].values())
+
+        return rebuild_result(model, params, state, init_params=init_params)
+
+
+_default_store = None
+
+
+def get_default_store(create=True):
+    '''
+    Get the store at the default location.
+
+    Unless *create* is True, None is returned if the store does not exist
+    yet. None is also returned if it cannot be opened, results are then
+    only kept in memory.
+    '''
+    global _default_store
+
+    if _default_store is None:
+        path = get_default_path()
+
+        if not create and path != ':memory:' and not os.path.exists(path):
+            return None
+
+        try:
+            _default_store = ResultStore()
+        except (OSError, sqlite3.Error) as exc:
+            warnings.warn('cannot open result store: {0}'.format(exc))
+            _default_store = False
+
+    return _default_store or None
@@ -0,0 +1,278 @@
+'''
+Save and load the models, start parameters and fit results of a FitWidget.
+
+A session file consists of a short preamble, a JSON header and the raw
+bytes of all arrays (fitted data, best fits and covariances). The header
+references each array by offset, dtype and shape, so the arrays are memory
+mapped when a session is loaded instead of being read into memory.
+
+Layout::
+
+    MAGIC | header length (uint64, little endian) | JSON header | arrays
+
+Arrays start at multiples of ALIGNMENT bytes.
+'''
+
+import json
+import os
+import struct
+import tempfile
+
+from lmfit import Parameters
+import numpy as np
+
+from .model_widget import ModelContainer, dump_description, load_description
+from .ranges import Range
+from .result_widget import (RESULT_ATTRIBUTES, ResultContainer,
+                            rebuild_result)
+from .results_store import STATISTICS
+
+
+MAGIC = b'MPLWSES1'
+ALIGNMENT = 64
+VERSION = 1
+
+# arrays of a ModelResult written to the session
+RESULT_ARRAYS = ['best_fit', 'covar']
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    elif isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError('cannot serialise {0!r}'.format(value))
+
+
+def _padding(offset):
+    return -offset % ALIGNMENT
+
+
+class _ArrayWriter(object):
+    '''Collect arrays and hand out references for the header'''
+    def __init__(self):
+        self.arrays = []
+        self.size = 0
+
+    def add(self, array):
+        if array is None:
+            return None
+
+        array = np.ascontiguousarray(array)
+
+        if array.dtype.hasobject:
+            return None
+
+        self.size += _padding(self.size)
+        ref = {'offset': self.size,
+               'dtype': array.dtype.str,
+               'shape': list(array.shape)}
+
+        self.arrays.append((self.size, array))
+        self.size += array.nbytes
+
+        return ref
+
+
+def _describe_result(result, writer):
+    x = result.userkws.get('x') if result.userkws else None
+    init_params = getattr(result, 'init_params', None)
+
+    desc = {'params': result.params.dumps(),
+            'init_params': (None if init_params is None
+                            else init_params.dumps()),
+            'statistics': dict((attr, getattr(result, attr, None))
+                               for attr in STATISTICS),
+            'data': {'x': writer.add(x),
+                     'y': writer.add(getattr(result, 'data', None)),
+                     'weights': writer.add(getattr(result, 'weights', None))}}
+
+    for attr in RESULT_ARRAYS:
+        desc[attr] = writer.add(getattr(result, attr, None))
+
+    return desc
+
+
+def save_session(path, models, range_=None):
+    '''
+    Write *models* (dict of ModelContainer) and the fit range *range_*
+    (Range) to *path*.
+    '''
+    writer = _ArrayWriter()
+    header = {'version': VERSION,
+              'range': None,
+              'models': []}
+
+    if range_ is not None:
+        header['range'] = {'include': range_.included,
+                           'exclude': range_.excluded}
+
+    for name, model in sorted(models.items()):
+        parameters = model.get_parameters()
+        results = []
+
+        for result_name, container in sorted(model.results.items()):
+            result = _describe_result(container.result, writer)
+            result['name'] = result_name
+            results.append(result)
+
+        header['models'].append({
+            'name': name,
+            'components': dump_description(model.describe()),
+            'parameters': (None if parameters is None
+                           else parameters.dumps()),
+            'results': results})
+
+    header = json.dumps(header, default=_json_default).encode('utf-8')
+    start = len(MAGIC) + 8 + len(header)
+    start += _padding(start)
+
+    # the arrays may be memory mapped from the file which is overwritten,
+    # it is only replaced once the new one is complete
+    path = os.path.abspath(path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                    suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(MAGIC)
+            fp.write(struct.pack('<Q', len(header)))
+            fp.write(header)
+
+            for offset, array in writer.arrays:
+                fp.seek(start + offset)
+                fp.write(array.tobytes())
+
+            # the file has to cover the last array even if it is empty
+            fp.truncate(start + writer.size)
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _read_header(fp):
+    if fp.read(len(MAGIC)) != MAGIC:
+        raise ValueError('not a session file')
+
+    try:
+        length, = struct.unpack('<Q', fp.read(8))
+    except struct.error:
+        raise ValueError('truncated session file')
+
+    header = json.loads(fp.read(length).decode('utf-8'))
+
+    start = len(MAGIC) + 8 + length
+    start += _padding(start)
+
+    return header, start
+
+
+def _map_array(path, start, ref):
+    if ref is None:
+        return None
+
+    shape = tuple(ref['shape'])
+
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=ref['dtype'])
+
+    return np.memmap(path, dtype=ref['dtype'], mode='r',
+                     offset=start + ref['offset'], shape=shape)
+
+
+def _load_result(path, start, model, desc):
+    params = Parameters().loads(desc['params'])
+    init_params = desc['init_params']
+
+    if init_params is not None:
+        init_params = Parameters().loads(init_params)
+
+    state = dict.fromkeys(RESULT_ATTRIBUTES)
+    state.update(desc['statistics'])
+    state['best_values'] = params.valuesdict()
+
+    if init_params is not None:
+        state['init_values'] = init_params.valuesdict()
+        state['init_vals'] = list(state['init_values'].values())
+
+    for attr in RESULT_ARRAYS:
+        state[attr] = _map_array(path, start, desc[attr])
+
+    data = dict((name, _map_array(path, start, ref))
+                for name, ref in desc['data'].items())
+
+    kwargs = {}
+
+    if data['x'] is not None:
+        kwargs['x'] = data['x']
+
+    return rebuild_result(model, params, state, init_params=init_params,
+                          data=data['y'], weights=data['weights'], **kwargs)
+
+
+def load_session(path):
+    '''
+    Read a session written by save_session.
+
+    Only the models in model_widget.MODELS can be loaded. A malformed or
+    unsupported session raises ValueError.
+
+    Returns
+    -------
+    models : dict
+        ModelContainer by name, with their fit results.
+    range_ : Range or None
+        Fit range.
+    '''
+    with open(path, 'rb') as fp:
+        header, start = _read_header(fp)
+
+    try:
+        return _load_header(path, start, header)
+    except (KeyError, IndexError, TypeError, AttributeError) as exc:
+        raise ValueError('malformed session file: {0}: {1}'.format(
+            type(exc).__name__, exc))
+
+
+def _load_header(path, start, header):
+    if header['version'] > VERSION:
+        raise ValueError('unsupported session version {0}'.format(
+            header['version']))
+
+    models = {}
+
+    for desc in header['models']:
+        description = load_description(desc['components'])
+
+        parameters = desc['parameters']
+
+        if parameters is not None:
+            parameters = Parameters().loads(parameters)
+
+        model = ModelContainer.from_description(desc['name'], description,
+                                                parameters=parameters)
+
+        for result in desc['results']:
+            container = ResultContainer(
+                _load_result(path, start, model.model, result),
+                name=result['name'])
+            model.add_result(result['name'], container)
+
+        models[model.name] = model
+
+    range_ = header['range']
+
+    if isinstance(range_, list):
+        # older sessions store the range as [xmin, xmax]
+        range_ = Range(*range_)
+    elif range_ is not None:
+        included, excluded = range_['include'], range_['exclude']
+        range_ = Range(exclude=excluded)
+
+        for interval in included:
+            range_.include(*interval)
+
+    return models, range_
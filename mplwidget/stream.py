@@ -0,0 +1,108 @@
+'''
+Streaming of live data into a MatplotlibWidget.
+'''
+
+import numpy as np
+
+
+class RingBuffer(object):
+    '''
+    Preallocated ring buffer with zero-copy access to its content.
+
+    Every value is written twice, at i and i + capacity, so the latest
+    values are always a contiguous slice of the storage and *view* does not
+    need to copy.
+    '''
+    def __init__(self, capacity, dtype=float):
+        self.capacity = int(capacity)
+        self._data = np.zeros(2 * self.capacity, dtype=dtype)
+        self._pos = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def view(self):
+        end = self._pos + self.capacity
+        return self._data[end - self.size:end]
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype).ravel()
+
+        # older values would be overwritten right away
+        values = values[-self.capacity:]
+        n = len(values)
+        cap = self.capacity
+        pos = self._pos
+
+        first = min(n, cap - pos)
+        self._data[pos:pos + first] = values[:first]
+        self._data[pos + cap:pos + cap + first] = values[:first]
+
+        rest = n - first
+
+        if rest > 0:
+            self._data[:rest] = values[first:]
+            self._data[cap:cap + rest] = values[first:]
+
+        self._pos = (pos + n) % cap
+        self.size = min(self.size + n, cap)
+
+    def clear(self):
+        self._pos = 0
+        self.size = 0
+
+
+class StreamLine(object):
+    '''
+    Handle for a line which is continuously fed with new data.
+
+    Appended data is kept in ring buffers holding the latest *capacity*
+    points. The line itself is only updated right before the canvas is
+    drawn, so the cost of an append does not depend on the amount of data
+    shown. Use MatplotlibWidget.stream_line to create one.
+    '''
+    def __init__(self, canvas, line, capacity):
+        self.canvas = canvas
+        self.line = line
+        self.x = RingBuffer(capacity)
+        self.y = RingBuffer(capacity)
+        self.stale = False
+
+    def append(self, x, y):
+        '''Append a single point or arrays of points'''
+        x = np.atleast_1d(x)
+        y = np.atleast_1d(y)
+
+        if len(x) != len(y):
+            raise ValueError('x and y must have the same length')
+
+        self.x.extend(x)
+        self.y.extend(y)
+        self.stale = True
+        self.canvas.request_redraw()
+
+    def get_data(self):
+        '''Views of the buffered data, valid until the next append'''
+        return self.x.view, self.y.view
+
+    def clear(self):
+        self.x.clear()
+        self.y.clear()
+        self.stale = True
+        self.canvas.request_redraw()
+
+    def flush(self):
+        '''
+        Hand the buffered data to the line.
+
+        Returns True if the line has been changed.
+        '''
+        if not self.stale:
+            return False
+
+        self.line.set_data(*self.get_data())
+        self.stale = False
+
+        return True